@@ -1,6 +1,9 @@
 # Atmospheric Models
 
+import functools
 import numpy as np
+from firesat.buffers import check_out
+from firesat.constants import BLOCK, DEG2RAD, R_EARTH
 
 WERTZ_1978_ATMOS = np.array([
 #   h_0 [km], rho_0 [kg/m3],    H [km]
@@ -20,7 +23,136 @@ WERTZ_1978_ATMOS = np.array([
     [   1000,     3.019e-15,  268.000],
 ])
 
-def exponential_density_model(h):
+
+# Harris-Priester density table for mean solar activity, F10.7 = 150
+HARRIS_PRIESTER = np.array([
+#   h [km], rho_min [g/km3], rho_max [g/km3]
+    [  100,   4.974e+05,   4.974e+05],
+    [  120,   2.490e+04,   2.490e+04],
+    [  130,   8.377e+03,   8.710e+03],
+    [  140,   3.899e+03,   4.059e+03],
+    [  150,   2.122e+03,   2.215e+03],
+    [  160,   1.263e+03,   1.344e+03],
+    [  170,   8.008e+02,   8.758e+02],
+    [  180,   5.283e+02,   6.010e+02],
+    [  190,   3.617e+02,   4.297e+02],
+    [  200,   2.557e+02,   3.162e+02],
+    [  210,   1.839e+02,   2.396e+02],
+    [  220,   1.341e+02,   1.853e+02],
+    [  230,   9.949e+01,   1.455e+02],
+    [  240,   7.488e+01,   1.157e+02],
+    [  250,   5.709e+01,   9.308e+01],
+    [  260,   4.403e+01,   7.555e+01],
+    [  270,   3.430e+01,   6.182e+01],
+    [  280,   2.697e+01,   5.095e+01],
+    [  290,   2.139e+01,   4.226e+01],
+    [  300,   1.708e+01,   3.526e+01],
+    [  320,   1.099e+01,   2.511e+01],
+    [  340,   7.214e+00,   1.819e+01],
+    [  360,   4.824e+00,   1.337e+01],
+    [  380,   3.274e+00,   9.955e+00],
+    [  400,   2.249e+00,   7.492e+00],
+    [  420,   1.558e+00,   5.684e+00],
+    [  440,   1.091e+00,   4.355e+00],
+    [  460,   7.701e-01,   3.362e+00],
+    [  480,   5.474e-01,   2.612e+00],
+    [  500,   3.916e-01,   2.042e+00],
+    [  520,   2.819e-01,   1.605e+00],
+    [  540,   2.042e-01,   1.267e+00],
+    [  560,   1.488e-01,   1.005e+00],
+    [  580,   1.092e-01,   7.997e-01],
+    [  600,   8.070e-02,   6.390e-01],
+    [  620,   6.012e-02,   5.123e-01],
+    [  640,   4.519e-02,   4.121e-01],
+    [  660,   3.430e-02,   3.325e-01],
+    [  680,   2.632e-02,   2.691e-01],
+    [  700,   2.043e-02,   2.185e-01],
+    [  720,   1.607e-02,   1.779e-01],
+    [  740,   1.281e-02,   1.452e-01],
+    [  760,   1.036e-02,   1.190e-01],
+    [  780,   8.496e-03,   9.776e-02],
+    [  800,   7.069e-03,   8.059e-02],
+    [  840,   4.680e-03,   5.741e-02],
+    [  880,   3.200e-03,   4.210e-02],
+    [  920,   2.210e-03,   3.130e-02],
+    [  960,   1.560e-03,   2.360e-02],
+    [ 1000,   1.150e-03,   1.810e-02],
+])
+HP_F10_7 = 150.0  # [sfu] solar flux of HARRIS_PRIESTER
+HP_LAG = 30.0 * DEG2RAD  # [rad] lag of the diurnal bulge behind the sun
+T_120 = 355.0  # [K] temperature at 120 km
+
+# Log density lookup tables on a uniform altitude grid. Every node of the
+# density tables is a multiple of the grid step, so each cell lies inside one
+# layer where log(rho) is linear in h. Each cell stores the intercept and slope
+# of log(rho), log(rho) = A + h*S, which reproduces the exponential model.
+_LUT_DH = 10.0  # [km]
+
+
+def _log_density_lut(h_node, log_rho, slope):
+    """Resample a piecewise log-linear density profile onto the uniform grid
+
+    Args:
+        h_node : float (m), base altitude of each layer, multiples of _LUT_DH [km]
+        log_rho : float (m), log density at the base of each layer
+        slope : float (m), d(log rho)/dh in each layer [1/km], the last layer
+            extends above the top of the table
+    Output:
+        A : float (k), intercept of log(rho) in each cell
+        S : float (k), slope of log(rho) in each cell [1/km]
+    """
+    h = np.arange(h_node[0], h_node[-1] + _LUT_DH, _LUT_DH)
+    layer = np.searchsorted(h_node, h, side="right") - 1
+    S = slope[layer]
+    A = log_rho[layer] - h_node[layer] * S
+    return A, S
+
+
+def _eval_log_density_lut(h, h0, A, S, rho):
+    """Evaluate rho = exp(A + h*S) from a table built by `_log_density_lut`
+
+    Args:
+        h : float (n), altitude [km]
+        h0 : float, altitude of the first cell [km]
+        A : float (k), intercept of log(rho) in each cell
+        S : float (k), slope of log(rho) in each cell [1/km]
+        rho : float (n), C-contiguous output array
+    Output:
+        rho : float (n), density, the first and last cells extend below and
+            above the table, nan where h is nan
+    """
+    imax = A.size - 1
+    # evaluate in cache sized blocks with reused scratch arrays
+    n = h.size
+    nb = max(min(n, BLOCK), 1)
+    x = np.empty(nb)
+    idx = np.empty(nb, dtype=np.intp)
+    for start in range(0, n, nb):
+        hb = h[start:start + nb]
+        m = hb.size
+        xb, ib, rb = x[:m], idx[:m], rho[start:start + nb]
+        # cell index computed directly instead of searched for
+        np.subtract(hb, h0, out=xb)
+        xb *= 1.0 / _LUT_DH
+        np.clip(xb, 0, imax, out=xb)
+        # a nan altitude takes the first cell, h*S keeps rho nan
+        np.nan_to_num(xb, copy=False)
+        ib[...] = xb
+        S.take(ib, out=xb)
+        np.multiply(hb, xb, out=rb)
+        rb += A.take(ib, out=xb)
+        np.exp(rb, out=rb)
+    return rho
+
+
+_LUT_H0 = WERTZ_1978_ATMOS[0, 0]
+_LUT_H1 = WERTZ_1978_ATMOS[-1, 0]
+_LUT_A, _LUT_S = _log_density_lut(
+    WERTZ_1978_ATMOS[:, 0], np.log(WERTZ_1978_ATMOS[:, 1]), -1.0 / WERTZ_1978_ATMOS[:, 2]
+)
+
+
+def exponential_density_model(h, out=None, bounds="extrapolate"):
     """Exponential density model. Assumes a spherically symmetrical distribution
     of particles in which the density varies exponentially. Based on US standard
     atmosphere model for h = [0, 25km], CIRA-72 for h = [25km, 500km], and
@@ -28,6 +160,12 @@ def exponential_density_model(h):
 
     Args:
         h : float (n), height above the ellipsoid [km]
+        out : float (n), optional C-contiguous output array
+        bounds : str, treatment of heights outside of the table, [150, 1000] km
+            'extrapolate' : use the scale height of the lowest or highest layer
+            'clip' : use the density at 150 km or 1000 km
+            'nan' : return nan
+            'raise' : raise a ValueError
     Output:
         rho : float (n), atmospheric density at altitude [kg/m^3]
 
@@ -36,12 +174,134 @@ def exponential_density_model(h):
         shows that scale height is equal to (k)*(temperature)/(molecular weight)*(gravity)
         where k is the Boltzmann constant
 
+        The layers are evaluated from a uniformly spaced table of log density,
+        so the cell index is computed directly instead of searched for.
+
     References:
         Vallado, p. 565, Eq. 8-33
     """
-    idx = np.searchsorted(WERTZ_1978_ATMOS[:,0], h, side='right') - 1
-    h0 = WERTZ_1978_ATMOS[idx, 0]
-    rho0 = WERTZ_1978_ATMOS[idx, 1]
-    H = WERTZ_1978_ATMOS[idx, 2]
-    rho = rho0 * np.exp(-(h - h0)/H)
-    return rho
+    h = np.asarray(h, dtype=float)
+    shape = h.shape
+    h = h.reshape(-1)
+    if bounds not in ("extrapolate", "clip", "nan", "raise"):
+        raise ValueError(f"unknown bounds option '{bounds}'")
+    if bounds != "extrapolate":
+        outside = ~((h >= _LUT_H0) & (h <= _LUT_H1))  # nan is outside
+        if bounds == "raise" and np.any(outside):
+            raise ValueError(
+                f"altitude outside of density table [{_LUT_H0}, {_LUT_H1}] km"
+            )
+        if bounds == "clip":
+            h = np.clip(h, _LUT_H0, _LUT_H1)
+    out = check_out(out, shape)
+    rho = out.reshape(-1)
+    _eval_log_density_lut(h, _LUT_H0, _LUT_A, _LUT_S, rho)
+    if bounds == "nan":
+        rho[outside] = np.nan
+    if out.ndim == 0:
+        return out[()]
+    return out
+
+
+def exospheric_temperature(F10_7):
+    """Nighttime minimum exospheric temperature
+
+    Args:
+        F10_7 : float (...), 10.7 cm solar radio flux [sfu]
+    Output:
+        T_inf : float (...), exospheric temperature [K]
+    References:
+        Jacchia, Smithsonian Astrophysical Observatory Special Report 313, 1970
+    """
+    return 379.0 + 3.24 * np.asarray(F10_7)
+
+
+@functools.lru_cache(maxsize=32)
+def harris_priester_lut(F10_7=HP_F10_7):
+    """Log density tables of the Harris-Priester model at one flux level,
+    built once and cached
+
+    The scale heights above 120 km are proportional to the mean temperature
+    of the thermosphere, (T_120 + T_inf)/2, so the log density decrement from
+    120 km is scaled by the ratio of the mean temperatures at the reference
+    and requested flux. The density at and below 120 km does not change.
+
+    Args:
+        F10_7 : float, 10.7 cm solar radio flux [sfu]
+    Output:
+        A_min, S_min, A_max, S_max : float (k), read-only intercept and slope
+            of log(rho) on the uniform grid for the antapex and apex of the
+            diurnal bulge, rho in [kg/m^3]
+    """
+    h = HARRIS_PRIESTER[:, 0]
+    scale = (T_120 + exospheric_temperature(HP_F10_7)) / (
+        T_120 + exospheric_temperature(F10_7)
+    )
+    i120 = np.searchsorted(h, 120.0)
+    tables = []
+    for rho in HARRIS_PRIESTER[:, 1:].T:
+        log_rho = np.log(rho * 1e-12)  # g/km^3 --> kg/m^3
+        log_rho[i120:] = log_rho[i120] + scale * (log_rho[i120:] - log_rho[i120])
+        slope = np.diff(log_rho) / np.diff(h)
+        for a in _log_density_lut(h, log_rho, np.append(slope, slope[-1])):
+            a.flags.writeable = False  # shared between calls
+            tables.append(a)
+    return tuple(tables)
+
+
+def harris_priester_density(r, rsun, F10_7=HP_F10_7, n_prm=2, out=None):
+    """Harris-Priester density model with the diurnal bulge and a solar flux
+    dependent thermosphere. The density varies between the tabulated minimum
+    at the antapex and maximum at the apex of the bulge, which lags the sun by
+    30 degrees in right ascension.
+
+    Args:
+        r : float (..., 3), satellite position vectors in ECI [km]
+        rsun : float (..., 3), sun position vectors in ECI from
+            `solar.sun_pos`, broadcast against r, e.g. (n_t, 3) for r of shape
+            (n_sat, n_t, 3)
+        F10_7 : float, 10.7 cm solar radio flux [sfu], 150 is mean activity
+        n_prm : float, exponent of the bulge, 2 for low and 6 for polar
+            inclination orbits
+        out : float (...), optional C-contiguous output array
+    Output:
+        rho : float (...), atmospheric density [kg/m^3]
+
+    Notes:
+        Altitudes are measured above a spherical Earth. Altitudes outside of
+        the table, [100, 1000] km, use the scale height of the lowest or
+        highest layer.
+
+    References:
+        Montenbruck and Gill, Satellite Orbits, 2000, Sec. 3.5.2
+        Long et al., GTDS Mathematical Theory, 1989, Sec. 4.3
+    """
+    r = np.asarray(r, dtype=float)
+    rsun = np.asarray(rsun, dtype=float)
+    shape = np.broadcast_shapes(r.shape, rsun.shape)[:-1]
+    out = check_out(out, shape)
+    A_min, S_min, A_max, S_max = harris_priester_lut(float(F10_7))
+    rnorm = np.linalg.norm(r, axis=-1)
+    h = np.broadcast_to(rnorm - R_EARTH, shape).reshape(-1)
+    rho = out.reshape(-1)
+    rho_max = np.empty_like(rho)
+    h0 = HARRIS_PRIESTER[0, 0]
+    _eval_log_density_lut(h, h0, A_min, S_min, rho)
+    _eval_log_density_lut(h, h0, A_max, S_max, rho_max)
+    # apex of the bulge from the sun right ascension and declination
+    ra = np.arctan2(rsun[..., 1], rsun[..., 0]) + HP_LAG
+    sdec = rsun[..., 2] / np.linalg.norm(rsun, axis=-1)
+    cdec = np.sqrt(1.0 - sdec * sdec)
+    cpsi = (
+        r[..., 0] * (cdec * np.cos(ra))
+        + r[..., 1] * (cdec * np.sin(ra))
+        + r[..., 2] * sdec
+    ) / rnorm
+    # cos^n(psi/2) = ((1 + cos(psi))/2)^(n/2)
+    bulge = np.broadcast_to((0.5 + 0.5 * cpsi) ** (0.5 * n_prm), shape).reshape(-1)
+    rho_max -= rho
+    rho_max *= bulge
+    rho += rho_max
+    if out.ndim == 0:
+        return out[()]
+    return out
@@ -1,8 +1,19 @@
 import numpy as np
+from collections import namedtuple
 import firesat.atmosphere as atmos
+import firesat.solar as solar
+import firesat.geomag as geomag
+import firesat.complex_step as cs
 import firesat
+from firesat.buffers import check_out
+from firesat.constants import AU_KM, BLOCK, OMEGA_EARTH
 
-def attitude(x=None, y=None, var_info=None, fidelity=0, **kwargs):
+AttitudeConstants = namedtuple(
+    "AttitudeConstants",
+    ["RE", "slew", "gravity", "solar", "magnetic", "aero", "omega_max", "P_hold"],
+)
+
+def attitude(x=None, y=None, var_info=None, fidelity=0, out=None, constants=None, **kwargs):
     """Attitude control model to compute the torques necessary to counteract
     moments on the satellite based on perturbations. Then computes the power
     required to the necessary power required to apply torque to reaction
@@ -30,6 +41,26 @@ def attitude(x=None, y=None, var_info=None, fidelity=0, **kwargs):
     var_info : dict
         Dictionary containing fixed parameters for problem
 
+    out : np.ndarray (2, n), optional
+        C-contiguous array the outputs are written to
+
+    constants : AttitudeConstants, optional
+        Scalar factors from `attitude_constants(var_info)`, computed once and
+        reused over repeated calls with the same var_info
+
+    **kwargs :
+        Optional keyword arguments
+        rho : (float or np.ndarray (n)) atmospheric density [kg/m^3] used for
+            the drag torque in place of the fixed or altitude based value,
+            e.g. the orbit-averaged density from `orbit_model.orbit_drag`
+        pdyn : (float or np.ndarray (n)) dynamic pressure 0.5*rho*v**2 [Pa]
+            used for the drag torque in place of rho and v, e.g. the peak
+            dynamic pressure from `orbit_model.orbit_drag`
+        r_traj, v_traj, rsun, jd, scale : trajectories, sun vectors and
+            julian dates used by the high fidelity model, fidelity >= 2, see
+            `disturbance_torques`. rho is then the density along the
+            trajectories, (n, n_t).
+
     Returns
     -------
     q : np.ndarray (2, n)
@@ -40,26 +71,19 @@ def attitude(x=None, y=None, var_info=None, fidelity=0, **kwargs):
     Notes
     -----
     Idea for hifidelity version: calculate the atmospheric density, rho, based on elevation H
+
+    With fidelity >= 2 the disturbance torque is the peak over the
+    trajectories of the time resolved torques from `disturbance_torques`.
+
+    The torques are fused into a single pass over blocks of samples, so only
+    a few block sized work arrays are allocated besides the output.
     """
 
     # Setup fixed input variables
     if not var_info:
         var_info = firesat.setup()
 
-    RE = var_info["RE"]
-    mu = var_info["mu"]
-    c = var_info["c"]
-    A_s = var_info["A_s"]
-    sun_i = var_info["sun_i"]
-    dt_slew = var_info["dt_slew"]
-    M = var_info["M"]
     rho = var_info["rho"]
-    A = var_info["A"]
-    n = var_info["n"]
-    omega_max = var_info["omega_max"]
-    P_hold = var_info["P_hold"]
-    theta = var_info["theta"]
-    RD = var_info["RD"]
 
     # Unpack design variables
     if (x is not None) and (x.shape[0] == 6):
@@ -74,9 +98,9 @@ def attitude(x=None, y=None, var_info=None, fidelity=0, **kwargs):
 
     # Unpack coupling variables
     if (y is not None) and (y.shape[0] >= 3):
-        v, dt_orbit, theta_slew = y[[0, 1, 2]]
+        v, dt_orbit, theta_slew = y[0], y[1], y[2]
         if y.shape[0] > 3:
-            I_max, I_min = y[[3, 4]]
+            I_max, I_min = y[3], y[4]
         else:
             I_max = var_info["I_max"]
             I_min = var_info["I_min"]
@@ -93,40 +117,519 @@ def attitude(x=None, y=None, var_info=None, fidelity=0, **kwargs):
         I_min = kwargs.get("I_min", var_info["I_min"])
 
     # Compute output quantitites
+    if x is not None:
+        nsamp = x.shape[1]  # number of samples
+    else:
+        nsamp = np.broadcast(H, F_s, L_sp, q, L_a, C_d, v, theta_slew).size
+    # complex inputs are kept for complex step derivatives
+    dtype = np.result_type(H, F_s, L_sp, q, L_a, C_d, v, theta_slew, I_max, I_min, float)
+    out = check_out(out, (2, nsamp), dtype=dtype)
+    if constants is None:
+        constants = attitude_constants(var_info)
 
-    if fidelity == 0:
-        # Low fidelity computation
-        tau_slew = 4 * theta_slew / (dt_slew) ** 2 * I_max
-        tau_g = 3 * mu / (2 * ((RE + H) ** 3)) * abs(I_max - I_min) * np.sin(2 * theta)
-        tau_sp = L_sp * F_s / c * A_s * (1 + q) * np.cos(sun_i)
-        tau_m = 2 * M * RD / ((RE + H) ** 3)
-        tau_a = 0.5 * L_a * rho * C_d * A * v ** 2
-        tau_dist = np.sqrt(tau_g ** 2 + tau_sp ** 2 + tau_m ** 2 + tau_a ** 2)
-        tau_tot = np.maximum(tau_slew, tau_dist)
-        # tau_tot    = tau_slew + tau_dist
-        PACS = tau_tot * omega_max + n * P_hold
-
-    if fidelity > 0:
+    if fidelity >= 2:
+        # High fidelity computation, peak disturbance torque along the orbit
+        stats = disturbance_torques(
+            kwargs["r_traj"],
+            kwargs["v_traj"],
+            kwargs["rsun"],
+            np.broadcast_arrays(H, F_s, L_sp, q, L_a, C_d, np.empty(nsamp))[:6],
+            var_info,
+            I_max,
+            I_min,
+            rho=kwargs.get("rho"),
+            constants=constants,
+            jd=kwargs.get("jd"),
+            scale=kwargs.get("scale", "utc"),
+        )
+        np.multiply(theta_slew, I_max, out=out[0])
+        out[0] *= constants.slew
+        np.maximum(out[0], stats[0, 4], out=out[0])
+        np.multiply(out[0], constants.omega_max, out=out[1])
+        out[1] += constants.P_hold
+        return out
+
+    if "pdyn" in kwargs:
+        # drag from the dynamic pressure, rho and v are not used
+        rho, v = None, kwargs["pdyn"]
+    elif "rho" in kwargs:
+        rho = kwargs["rho"]
+    elif fidelity > 0:
         # Medium fidelity computation
-        tau_slew = 4 * theta_slew / (dt_slew) ** 2 * I_max
-        tau_g = 3 * mu / (2 * ((RE + H) ** 3)) * abs(I_max - I_min) * np.sin(2 * theta)
-        tau_sp = L_sp * F_s / c * A_s * (1 + q) * np.cos(sun_i)
-        tau_m = 2 * M * RD / ((RE + H) ** 3)
+        # use exponential atmospheric density model, evaluated per block
+        rho = None
+
+    # Assemble Attitude Control outputs
+    args = [
+        np.broadcast_to(np.asarray(a, dtype=dtype), (nsamp,))
+        for a in (H, F_s, L_sp, q, L_a, C_d, v, theta_slew, I_max, I_min)
+    ]
+    if rho is not None:
+        args.append(np.broadcast_to(np.asarray(rho, dtype=dtype), (nsamp,)))
+    nb = max(min(nsamp, BLOCK), 1)
+    scratch = np.empty((3, nb), dtype=dtype)
+    for start in range(0, nsamp, nb):
+        stop = min(start + nb, nsamp)
+        _attitude_block(
+            [a[start:stop] for a in args],
+            constants,
+            "pdyn" in kwargs,
+            out[:, start:stop],
+            scratch[:, :stop - start],
+        )
+    return out
+
+
+def attitude_partials(x, y, var_info, constants=None):
+    """Analytic partial derivatives of the low fidelity attitude model with
+    the fixed atmospheric density rho of var_info.
 
-        # use exponential atmospheric density model
-        rho = atmos.exponential_density_model(H/1000)
-        tau_a = 0.5 * L_a * rho * C_d * A * v ** 2
+    Parameters
+    ----------
+    x : np.ndarray (6, n)
+        Input design vars, H, F_s, L_sp, q, L_a, C_d, see `attitude`
 
+    y : np.ndarray (3 or 5, n)
+        Input coupling vars, v, dt_orbit, theta_slew and optionally I_max and
+        I_min, see `attitude`
 
-        tau_dist = np.sqrt(tau_g ** 2 + tau_sp ** 2 + tau_m ** 2 + tau_a ** 2)
-        tau_tot = np.maximum(tau_slew, tau_dist)
-        # tau_tot    = tau_slew + tau_dist
-        PACS = tau_tot * omega_max + n * P_hold
+    var_info : dict
+        Dictionary containing fixed parameters for problem
 
+    constants : AttitudeConstants, optional
+        Scalar factors from `attitude_constants(var_info)`
 
-    # Assemble Attitude Control outputs
-    n = x.shape[1]  # number of samples
-    q = np.zeros((2, n))
-    q[0] = tau_tot
-    q[1] = PACS
+    Returns
+    -------
+    dq_dx : np.ndarray (2, 6, n)
+        Derivatives of tau_tot and PACS with respect to x
+
+    dq_dy : np.ndarray (2, 5, n)
+        Derivatives of tau_tot and PACS with respect to v, dt_orbit,
+        theta_slew, I_max and I_min
+
+    Notes
+    -----
+    tau_tot is the larger of the slewing and the disturbance torques, its
+    derivative is that of the larger one.
+    """
+    if constants is None:
+        constants = attitude_constants(var_info)
+    H, F_s, L_sp, q, L_a, C_d = x
+    v, theta_slew = y[0], y[2]
+    if y.shape[0] > 3:
+        I_max, I_min = y[3], y[4]
+    else:
+        I_max, I_min = var_info["I_max"], var_info["I_min"]
+    rho = var_info["rho"]
+    dtype = np.result_type(x, y)
+    n = x.shape[1]
+
+    # torques, see `_attitude_block`
+    r3 = 1 / (H + constants.RE) ** 3
+    dI = I_max - I_min
+    tau_g = constants.gravity * cs.absolute(dI) * r3
+    tau_m = constants.magnetic * r3
+    tau_sp = constants.solar * (1 + q) * L_sp * F_s
+    tau_a = constants.aero * L_a * C_d * 0.5 * rho * v * v
+    tau_dist = np.sqrt(tau_g * tau_g + tau_m * tau_m + tau_sp * tau_sp + tau_a * tau_a)
+    tau_slew = constants.slew * theta_slew * I_max
+
+    # d(tau_dist) = sum(tau_i d(tau_i)) / tau_dist
+    dist_dx = np.zeros((6, n), dtype=dtype)
+    dist_dy = np.zeros((5, n), dtype=dtype)
+    dist_dx[0] = -3 * (tau_g * tau_g + tau_m * tau_m) / (H + constants.RE)
+    dist_dx[1] = tau_sp * tau_sp / F_s
+    dist_dx[2] = tau_sp * tau_sp / L_sp
+    dist_dx[3] = tau_sp * tau_sp / (1 + q)
+    dist_dx[4] = tau_a * tau_a / L_a
+    dist_dx[5] = tau_a * tau_a / C_d
+    dist_dy[0] = 2 * tau_a * tau_a / v
+    dist_dy[3] = tau_g * constants.gravity * np.sign(np.real(dI)) * r3
+    dist_dy[4] = -dist_dy[3]
+    dist_dx /= tau_dist
+    dist_dy /= tau_dist
+
+    slew = np.real(tau_slew) >= np.real(tau_dist)
+    dq_dx = np.zeros((2, 6, n), dtype=dtype)
+    dq_dy = np.zeros((2, 5, n), dtype=dtype)
+    dq_dx[0] = np.where(slew, 0.0, dist_dx)
+    dq_dy[0] = np.where(slew, 0.0, dist_dy)
+    dq_dy[0, 2] = np.where(slew, constants.slew * I_max, 0.0)
+    dq_dy[0, 3] += np.where(slew, constants.slew * theta_slew, 0.0)
+    dq_dx[1] = constants.omega_max * dq_dx[0]
+    dq_dy[1] = constants.omega_max * dq_dy[0]
+    return dq_dx, dq_dy
+
+
+def attitude_constants(var_info):
+    """Combine the fixed parameters of the attitude model into the scalar
+    factors used by every sample.
+
+    Parameters
+    ----------
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    Returns
+    -------
+    constants : AttitudeConstants
+        Scalar factors of the torque and power equations, can be passed to
+        `attitude` to skip recomputing them
+    """
+    return AttitudeConstants(
+        RE=var_info["RE"],
+        slew=4 / var_info["dt_slew"] ** 2,
+        gravity=3 * var_info["mu"] / 2 * np.sin(2 * var_info["theta"]),
+        solar=var_info["A_s"] / var_info["c"] * np.cos(var_info["sun_i"]),
+        magnetic=2 * var_info["M"] * var_info["RD"],
+        aero=var_info["A"],
+        omega_max=var_info["omega_max"],
+        P_hold=var_info["n"] * var_info["P_hold"],
+    )
+
+
+def _attitude_block(args, const, use_pdyn, out, scratch):
+    """Evaluate tau_tot and PACS for one block of samples in place.
+
+    Parameters
+    ----------
+    args : list of np.ndarray (m)
+        H, F_s, L_sp, q, L_a, C_d, v (or pdyn), theta_slew, I_max, I_min and
+        optionally rho for the block
+    const : AttitudeConstants
+        Scalar factors from `attitude_constants`
+    use_pdyn : bool
+        v holds the dynamic pressure and the drag does not use rho
+    out : np.ndarray (2, m)
+        Output rows for tau_tot and PACS
+    scratch : np.ndarray (3, m)
+        Work space
+    """
+    H, F_s, L_sp, q, L_a, C_d, v, theta_slew, I_max, I_min = args[:10]
+    s1, s2, s3 = scratch
+    tau_tot, PACS = out
+    # gravity gradient and magnetic torques both scale with 1/(RE + H)**3
+    np.add(H, const.RE, out=s1)
+    np.multiply(s1, s1, out=s2)
+    s2 *= s1
+    np.reciprocal(s2, out=s1)
+    np.subtract(I_max, I_min, out=s2)
+    cs.absolute(s2, out=s2)
+    s2 *= const.gravity
+    s2 *= s1
+    s2 *= s2  # tau_g**2
+    s1 *= const.magnetic
+    s1 *= s1  # tau_m**2
+    s1 += s2
+    # solar pressure torque
+    np.add(q, 1, out=s2)
+    s2 *= L_sp
+    s2 *= F_s
+    s2 *= const.solar
+    s2 *= s2
+    s1 += s2
+    # aerodynamic torque
+    np.multiply(L_a, C_d, out=s2)
+    s2 *= const.aero
+    if use_pdyn:
+        s2 *= v
+    else:
+        if len(args) > 10:
+            rho = args[10]
+        else:
+            np.multiply(H, 1e-3, out=s3)
+            rho = atmos.exponential_density_model(s3, out=s3)
+        s2 *= rho
+        s2 *= v
+        s2 *= v
+        s2 *= 0.5
+    s2 *= s2
+    s1 += s2
+    np.sqrt(s1, out=s1)  # tau_dist
+    # slewing torque
+    np.multiply(theta_slew, I_max, out=tau_tot)
+    tau_tot *= const.slew
+    cs.maximum(tau_tot, s1, out=tau_tot)
+    np.multiply(tau_tot, const.omega_max, out=PACS)
+    PACS += const.P_hold
+
+
+def disturbance_torques(
+    r_traj,
+    v_traj,
+    rsun,
+    x,
+    var_info,
+    I_max=None,
+    I_min=None,
+    rho=None,
+    constants=None,
+    jd=None,
+    scale="utc",
+):
+    """Time resolved disturbance torques along propagated trajectories,
+    reduced to the peak and RMS over time of every sample.
+
+    Parameters
+    ----------
+    r_traj : np.ndarray (n, n_t, 3)
+        Position vectors in ECI coordinates [km], e.g. from
+        `orbit_model.propagate`
+
+    v_traj : np.ndarray (n, n_t, 3)
+        Velocity vectors in ECI coordinates [km/s]
+
+    rsun : np.ndarray (n_t, 3) or (n, n_t, 3)
+        Sun position vectors in ECI coordinates [km], from `solar.sun_pos`,
+        a single (1, 3) vector is broadcast over the time steps
+
+    x : np.ndarray (6, n)
+        Input design vars H, F_s, L_sp, q, L_a, C_d as in `attitude`, H is
+        not used
+
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    I_max, I_min : np.ndarray (n), optional
+        Moments of inertia [kg m^2], default to var_info
+
+    rho : np.ndarray (n, n_t), optional
+        Density along the trajectories [kg/m^3], e.g. from
+        `atmosphere.harris_priester_density`. Defaults to
+        `atmosphere.exponential_density_model`.
+
+    constants : AttitudeConstants, optional
+        Scalar factors from `attitude_constants(var_info)`
+
+    jd : np.ndarray (n_t) or timefn.JulianDate, optional
+        Julian dates of the time steps. If given, the magnetic torque uses
+        the IGRF tilted dipole from `geomag`, otherwise an axial dipole of
+        strength var_info["M"].
+
+    scale : str
+        Time scale of jd
+
+    Returns
+    -------
+    stats : np.ndarray (2, 5, n)
+        stats[0] = peak torque over time [N m]
+        stats[1] = RMS torque over time [N m]
+        of the torques
+        [0] = tau_g, gravity gradient at the off-nadir angle theta
+        [1] = tau_sp, solar pressure scaled by the sun distance and the
+              fraction of the sun visible from the satellite
+        [2] = tau_m, residual dipole in the Earth's dipole field
+        [3] = tau_a, drag with the speed relative to the rotating atmosphere
+        [4] = tau_dist, root sum square of the four
+
+    Notes
+    -----
+    All samples are evaluated together on blocks of time steps, and the peak
+    and sum of squares are accumulated block by block, so the work arrays
+    hold about `constants.BLOCK` points independent of the trajectory length.
+
+    References
+    ----------
+    Wertz, Space Mission Analysis and Design, 1999, Table 11-9
+    """
+    n = r_traj.shape[0]
+    n_t = r_traj.shape[1]
+    peak = np.zeros((5, n))
+    sumsq = np.zeros((5, n))
+    for start, stop, tau in _torque_blocks(
+        r_traj, v_traj, rsun, x, var_info, I_max, I_min, rho, constants, jd, scale
+    ):
+        np.maximum(peak, tau.max(axis=-1), out=peak)
+        tau *= tau
+        sumsq += tau.sum(axis=-1)
+    sumsq /= n_t
+    return np.stack((peak, np.sqrt(sumsq)))
+
+
+def torque_history(
+    r_traj,
+    v_traj,
+    rsun,
+    x,
+    var_info,
+    I_max=None,
+    I_min=None,
+    rho=None,
+    constants=None,
+    jd=None,
+    scale="utc",
+    out=None,
+):
+    """Time resolved disturbance torques along propagated trajectories.
+
+    Parameters
+    ----------
+    r_traj, v_traj, rsun, x, var_info, I_max, I_min, rho, constants, jd, scale
+        See `disturbance_torques`
+
+    out : np.ndarray (5, n, n_t), optional
+        C-contiguous array the torques are written to
+
+    Returns
+    -------
+    tau : np.ndarray (5, n, n_t)
+        tau_g, tau_sp, tau_m, tau_a and tau_dist at every time step [N m],
+        see `disturbance_torques`
+    """
+    shape = (5,) + r_traj.shape[:2]
+    out = check_out(out, shape)
+    for start, stop, tau in _torque_blocks(
+        r_traj, v_traj, rsun, x, var_info, I_max, I_min, rho, constants, jd, scale
+    ):
+        out[:, :, start:stop] = tau
+    return out
+
+
+def _torque_blocks(
+    r_traj, v_traj, rsun, x, var_info, I_max, I_min, rho, constants, jd, scale
+):
+    """Generate the disturbance torques of all samples on blocks of time
+    steps, yielding (start, stop, tau) with tau of shape (5, n, stop - start).
+    """
+    if constants is None:
+        constants = attitude_constants(var_info)
+    if I_max is None:
+        I_max = var_info["I_max"]
+    if I_min is None:
+        I_min = var_info["I_min"]
+    n, n_t = r_traj.shape[:2]
+    rsun = np.asarray(rsun)
+    rsun = np.broadcast_to(rsun, rsun.shape[:-2] + (n_t, 3))
+    F_s, L_sp, q, L_a, C_d = (np.asarray(a)[..., None] for a in x[1:])
+    # per sample factors of each torque
+    c_g = np.abs(constants.gravity * (np.asarray(I_max) - I_min) * np.ones(n))[:, None]
+    c_sp = constants.solar * L_sp * F_s * (1 + q)
+    c_a = 0.5 * constants.aero * L_a * C_d
+    c_m = 0.5 * constants.magnetic
+    RE = constants.RE * 1e-3  # [km]
+    if jd is not None:
+        g = geomag.dipole_eci(jd, scale)  # (n_t, 3)
+    nb = max(min(n_t, BLOCK // max(n, 1)), 1)
+    for start in range(0, n_t, nb):
+        stop = min(start + nb, n_t)
+        r = r_traj[:, start:stop]
+        v = v_traj[:, start:stop]
+        rs = rsun[..., start:stop, :]
+        rnorm = np.linalg.norm(r, axis=-1)
+        inv_r3 = (rnorm * 1000) ** -3
+        sinlat = r[..., 2] / rnorm
+        # speed relative to the atmosphere co-rotating with the Earth [m/s]
+        vx = v[..., 0] + OMEGA_EARTH * r[..., 1]
+        vy = v[..., 1] - OMEGA_EARTH * r[..., 0]
+        vrel2 = (vx * vx + vy * vy + v[..., 2] * v[..., 2]) * 1e6
+        if rho is None:
+            rho_b = atmos.exponential_density_model(rnorm - RE)
+        else:
+            rho_b = rho[:, start:stop]
+        dsun2 = np.sum((rs - r) ** 2, axis=-1)
+        tau = np.empty((5,) + rnorm.shape)
+        np.multiply(c_g, inv_r3, out=tau[0])
+        np.multiply(c_sp, solar.shadow_fraction(r, rs) * (AU_KM * AU_KM) / dsun2, out=tau[1])
+        if jd is None:
+            np.multiply(c_m * inv_r3, np.sqrt(1 + 3 * sinlat * sinlat), out=tau[2])
+        else:
+            RD = var_info["RD"]
+            np.multiply(RD, geomag.field_magnitude(r, g=g[start:stop]), out=tau[2])
+        np.multiply(c_a, rho_b * vrel2, out=tau[3])
+        np.sqrt(np.sum(tau[:4] * tau[:4], axis=0), out=tau[4])
+        yield start, stop, tau
+
+
+def wheel_momentum(tau, dt, h_max, omega_max=None, dt_orbit=None, history=False):
+    """Integrate the reaction wheel momentum over a torque timeline, with the
+    wheels desaturated whenever the stored momentum reaches h_max.
+
+    Parameters
+    ----------
+    tau : np.ndarray (n, n_t)
+        Disturbance torque at each time step [N m]. Torque magnitudes, e.g.
+        tau_dist from `torque_history`, give the worst case where every
+        disturbance is secular, a signed component lets cyclic torques cancel.
+
+    dt : float
+        Time step [s]
+
+    h_max : float or np.ndarray (n)
+        Wheel momentum at which a desaturation dump is triggered [N m s]
+
+    omega_max : float, optional
+        Wheel speed, in the units of `attitude`, for the dump energy.
+        Defaults to 1, which gives the dumped momentum instead.
+
+    dt_orbit : np.ndarray (n), optional
+        Orbit period [s] for the momentum accumulated per orbit. Defaults to
+        the length of the timeline.
+
+    history : bool
+        Also return the momentum at every time step
+
+    Returns
+    -------
+    q : np.ndarray (4, n)
+        q[0] = h_orbit, momentum accumulated per orbit without dumps [N m s]
+        q[1] = n_dump, number of desaturation events
+        q[2] = E_dump, wheel energy removed by the dumps, 0.5*h*omega_max
+        q[3] = h_peak, peak momentum the wheels must store [N m s]
+
+    h : np.ndarray (n, n_t)
+        Stored momentum after each time step [N m s], if history is True
+
+    Notes
+    -----
+    The momentum is the cumulative sum of the torque. A dump removes the
+    whole stored momentum at the step it reaches h_max, which splits the
+    timeline into segments. The timeline is scanned in blocks of steps for
+    all samples at once, with one more pass over the rest of a block for
+    every dump in it, so the cost grows with n*n_t and not with the number
+    of dumps times the timeline. The momentum is the cumulative sum minus
+    the cumulative sum of the dumped momentum.
+    """
+    tau = np.asarray(tau, dtype=float)
+    n, n_t = tau.shape
+    h_max = np.broadcast_to(np.asarray(h_max, dtype=float), (n,))
+    S = np.cumsum(tau, axis=1)
+    S *= dt
+    dumped = np.zeros((n, n_t))
+    base = np.zeros(n)  # cumulative momentum at the last dump
+    start = np.zeros(n, dtype=np.intp)  # first step after the last dump
+    n_dump = np.zeros(n)
+    # scan the timeline in blocks of steps, so each dump only rescans the
+    # rest of its block instead of the rest of the timeline
+    nb = min(max(BLOCK // max(n, 1), 64), max(n_t, 1))
+    t = np.arange(nb)
+    for b0 in range(0, n_t, nb):
+        Sb = S[:, b0:b0 + nb]
+        tb = t[:Sb.shape[1]] + b0
+        active = np.arange(n)
+        while active.size:
+            h = Sb[active] - base[active, None]
+            cross = np.abs(h) >= h_max[active, None]
+            cross &= tb >= start[active, None]
+            hit = cross.any(axis=1)
+            active = active[hit]
+            k = cross[hit].argmax(axis=1) + b0
+            dumped[active, k] = S[active, k] - base[active]
+            base[active] = S[active, k]
+            start[active] = k + 1
+            n_dump[active] += 1
+    q = np.empty((4, n))
+    if dt_orbit is None:
+        dt_orbit = n_t * dt
+    np.multiply(np.abs(S[:, -1]), dt_orbit, out=q[0])
+    q[0] /= n_t * dt
+    q[1] = n_dump
+    np.sum(np.abs(dumped), axis=1, out=q[2])
+    q[2] *= 0.5 * (1.0 if omega_max is None else omega_max)
+    # momentum stored between dumps, the peak includes the momentum reached
+    # at each dump
+    S -= np.cumsum(dumped, axis=1)
+    np.maximum(np.max(np.abs(S), axis=1), np.max(np.abs(dumped), axis=1), out=q[3])
+    if history:
+        return q, S
     return q
@@ -0,0 +1,135 @@
+# Solar beta angle and analytic eclipse time for circular orbits
+
+import numpy as np
+from firesat import solar
+from firesat.constants import J2, DEG2RAD
+
+
+def orbit_normal(raan, incl):
+    """Unit vector normal to the orbit plane
+    Args:
+        raan : float (...), right ascension of the ascending node [rad]
+        incl : float (...), inclination [rad]
+    Output:
+        h : float (..., 3), orbit normal in ECI coordinates
+    """
+    raan, incl = np.broadcast_arrays(raan, incl)
+    sini = np.sin(incl)
+    h = np.empty(raan.shape + (3,))
+    h[..., 0] = sini * np.sin(raan)
+    h[..., 1] = -sini * np.cos(raan)
+    h[..., 2] = np.cos(incl)
+    return h
+
+
+def beta_angle(raan, incl, rsun):
+    """Compute the solar beta angle, the angle between the sun vector and the
+    orbit plane
+    Args:
+        raan : float (...), right ascension of the ascending node [rad]
+        incl : float (...), inclination [rad]
+        rsun : float (..., 3), sun position vector in ECI, broadcast against
+            raan and incl
+    Output:
+        beta : float (...), beta angle [rad], positive on the side of the
+            orbit normal
+    References:
+        Vallado, p. 868
+    """
+    h = orbit_normal(raan, incl)
+    sbeta = np.sum(h * rsun, axis=-1) / np.linalg.norm(rsun, axis=-1)
+    return np.arcsin(np.clip(sbeta, -1.0, 1.0))
+
+
+def eclipse_fraction(beta, H, RE):
+    """Fraction of a circular orbit spent in the Earth's cylindrical shadow
+    Args:
+        beta : float (...), beta angle [rad]
+        H : float (...), altitude, same units as RE
+        RE : float, radius of the Earth
+    Output:
+        f : float (...), eclipse fraction between 0 and 0.5. For beta = 0 this
+            is arcsin(RE/(RE+H))/pi, the low fidelity orbit model.
+    References:
+        Wertz, Space Mission Analysis and Design, 1999, Sec. 5.1
+    """
+    r = RE + H
+    cosb = np.cos(beta)
+    # no eclipse once |beta| exceeds arcsin(RE/r)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        arg = np.sqrt(H * H + 2 * RE * H) / (r * cosb)
+    return np.arccos(np.minimum(arg, 1.0)) / np.pi
+
+
+def nodal_regression_rate(H, incl, mu, RE):
+    """Secular drift of the ascending node of a circular orbit due to J2
+    Args:
+        H : float (...), altitude [m]
+        incl : float (...), inclination [rad]
+        mu : float, gravitational parameter [m^3/s^2]
+        RE : float, radius of the Earth [m]
+    Output:
+        raan_dot : float (...), rate of change of raan [rad/s]
+    References:
+        Vallado, p. 647, Eq. 9-41
+    """
+    a = RE + H
+    n = np.sqrt(mu / a ** 3)
+    return -1.5 * n * J2 * (RE / a) ** 2 * np.cos(incl)
+
+
+def beta_table(jdt, H, var_info, raan0=0.0, incl=10 * DEG2RAD, jd_epoch=None):
+    """Tabulate the beta angle of many circular orbits over a time grid. The
+    sun vectors are computed once for the grid and shared by all samples.
+
+    Args:
+        jdt : float (n_t), julian dates
+        H : float (n), altitude [m]
+        var_info : dict, fixed parameters for problem, uses RE and mu
+        raan0 : float (n) or scalar, raan at jd_epoch [rad]
+        incl : float (n) or scalar, inclination [rad], the default matches
+            sgp4.Satellite
+        jd_epoch : float, julian date of raan0, defaults to jdt[0]
+    Output:
+        beta : float (n, n_t), beta angle [rad]
+    """
+    jdt = np.atleast_1d(jdt)
+    H = np.atleast_1d(H)
+    if jd_epoch is None:
+        jd_epoch = jdt[0]
+    rsun = solar.sun_pos(jdt)  # (n_t, 3)
+    raan_dot = nodal_regression_rate(H, incl, var_info["mu"], var_info["RE"])
+    raan = np.asarray(raan0)[..., None] + np.asarray(raan_dot)[..., None] * (
+        (jdt - jd_epoch) * 86400.0
+    )
+    return beta_angle(raan, np.asarray(incl)[..., None], rsun)
+
+
+def seasonal_eclipse(H, var_info, jd_start, ndays=365.25, step=1.0, **kwargs):
+    """Eclipse duration statistics of circular orbits over a season or
+    mission year, from the analytic eclipse fraction and a daily beta table
+
+    Args:
+        H : float (n), altitude [m]
+        var_info : dict, fixed parameters for problem, uses RE and mu
+        jd_start : float, julian date at the start of the period
+        ndays : float, length of the period [days]
+        step : float, spacing of the beta table [days]
+        **kwargs : raan0, incl, passed to `beta_table`
+    Output:
+        dt_eclipse : float (3, n), mean, minimum and maximum eclipse
+            duration per orbit over the period [s]
+    """
+    mu = var_info["mu"]
+    RE = var_info["RE"]
+    H = np.atleast_1d(H)
+    jdt = jd_start + np.arange(0.0, ndays + step, step)
+    beta = beta_table(jdt, H, var_info, **kwargs)
+    dt_orbit = 2 * np.pi * np.sqrt((RE + H) ** 3 / mu)
+    frac = eclipse_fraction(beta, H[:, None], RE)
+    out = np.empty((3, H.size))
+    np.mean(frac, axis=1, out=out[0])
+    np.min(frac, axis=1, out=out[1])
+    np.max(frac, axis=1, out=out[2])
+    out *= dt_orbit
+    return out
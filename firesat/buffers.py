@@ -0,0 +1,21 @@
+# Output buffers of the vectorized models
+
+import numpy as np
+
+
+def check_out(out, shape, dtype=float):
+    """Output array of a vectorized model
+
+    Args:
+        out : np.ndarray or None, array passed by the caller
+        shape : tuple, required shape
+        dtype : data type of a new array
+    Output:
+        out : np.ndarray shape, a new array if out is None, otherwise out
+            after checking it can be written to in place
+    """
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a C-contiguous array of shape {shape}")
+    return out
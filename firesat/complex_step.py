@@ -0,0 +1,78 @@
+# Complex step differentiation of the vectorized discipline models
+
+import numpy as np
+
+H_STEP = 1e-30  # imaginary step, far below the round-off of the real part
+
+
+def maximum(a, b, out=None):
+    """Elementwise maximum that also accepts complex steps
+
+    Args:
+        a, b : float or complex (...), arrays to compare
+        out : (...), optional output array
+    Output:
+        c : (...), the element of a or b with the larger real part, so the
+            imaginary part of a complex step follows the selected branch.
+            For real input this is np.maximum.
+    """
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _select(np.real(b) > np.real(a), b, a, out)
+    return np.maximum(a, b, out=out)
+
+
+def minimum(a, b, out=None):
+    """Elementwise minimum that also accepts complex steps, see `maximum`"""
+    if np.iscomplexobj(a) or np.iscomplexobj(b):
+        return _select(np.real(b) < np.real(a), b, a, out)
+    return np.minimum(a, b, out=out)
+
+
+def absolute(a, out=None):
+    """Elementwise absolute value that also accepts complex steps
+
+    Args:
+        a : float or complex (...)
+        out : (...), optional output array
+    Output:
+        c : (...), a with the sign of its real part removed. np.abs of a
+            complex number is its modulus, which drops the derivative.
+    """
+    if np.iscomplexobj(a):
+        return _select(np.real(a) < 0, -a, a, out)
+    return np.abs(a, out=out)
+
+
+def _select(mask, b, a, out):
+    c = np.where(mask, b, a)
+    if out is None:
+        return c
+    out[...] = c
+    return out
+
+
+def jacobian(f, x, h=H_STEP):
+    """Derivatives of a vectorized function by complex steps in each input
+
+    Args:
+        f : callable, f(x) -> (m, n) for inputs x (d, n), evaluated in
+            complex arithmetic
+        x : float (d, n), real inputs of n independent samples
+        h : float, imaginary step
+    Output:
+        J : float (m, d, n), J[i, j] = df_i/dx_j, exact to round-off since the
+            step involves no subtraction
+    References:
+        Martins, Sturdza and Alonso, The complex-step derivative
+        approximation, ACM Transactions on Mathematical Software, 2003
+    """
+    x = np.asarray(x, dtype=float)
+    J = None
+    for j in range(x.shape[0]):
+        xc = x.astype(complex)
+        xc[j] += 1j * h
+        fj = np.imag(f(xc)) / h
+        if J is None:
+            J = np.empty((fj.shape[0], x.shape[0]) + fj.shape[1:])
+        J[:, j] = fj
+    return J
@@ -1,11 +1,13 @@
 # constants
 
 R_EARTH = 6378.137  # [km] Mean equatorial radius
+R_SUN = 696000.0  # [km] Mean solar radius
 R2_EARTH = 40680631.59076899  # [km2] mean equat. radius sq.
 e_EARTH = 0.081816221456  # Earth eccentricity
 e2_EARTH = 0.006694385000  # Earth eccentricity squared
 MU = 398600.4418  # [km3/(solar s)2] gravitational parameter
 J2 = 0.0010826267
+OMEGA_EARTH = 7.292115e-5  # [rad/s] Earth rotation rate
 J2000 = 2451545.0
 
 # Various constants required by Skyfield
@@ -19,3 +21,6 @@ ASEC2RAD = 4.848136811095359935899141e-6
 DEG2RAD = 0.017453292519943296
 RAD2DEG = 57.295779513082321
 tau = 6.283185307179586476925287 # lower case, for symmetry with math.pi
+
+# Vectorized evaluation
+BLOCK = 16384  # number of points the models evaluate at a time
@@ -0,0 +1,141 @@
+# Chebyshev segment ephemeris for the sun position vector
+
+import numpy as np
+from firesat import solar, timefn
+from firesat.buffers import check_out
+
+
+class SunEphemeris(object):
+    """Piecewise Chebyshev fit of `solar.sun_pos` over a span of julian dates.
+
+    The span is divided into equal segments of `seg_days` days. On each segment
+    the three ECI components of the sun vector are fit with a Chebyshev series
+    of degree `deg` by interpolation at the Chebyshev nodes, and evaluated with
+    the Clenshaw recurrence. The table is small, so it can be built once for a
+    whole mission lifetime, saved, and memory-mapped by later runs.
+
+    Attributes:
+        coef : float (nseg, deg+1, 3), Chebyshev coefficients per segment [km]
+        jd0 : float, julian date at the start of the first segment
+        seg_days : float, segment length [days]
+        err : float, maximum deviation from `solar.sun_pos` found when the
+            table was built [km]
+
+    References:
+        Press et al., Numerical Recipes, 3rd ed., 2007, Sec. 5.8
+        Newhall, Numerical representation of planetary ephemerides, 1989
+    """
+
+    def __init__(self, coef, jd0, seg_days, err=np.nan):
+        self.coef = coef
+        self.jd0 = float(jd0)
+        self.seg_days = float(seg_days)
+        self.err = float(err)
+
+    @property
+    def nseg(self):
+        return self.coef.shape[0]
+
+    @property
+    def deg(self):
+        return self.coef.shape[1] - 1
+
+    @property
+    def jd1(self):
+        """Julian date at the end of the last segment"""
+        return self.jd0 + self.nseg * self.seg_days
+
+    @classmethod
+    def build(cls, jd_start, jd_end, seg_days=1.0, deg=4, ncheck=64):
+        """Fit the sun position vector between two julian dates
+
+        Args:
+            jd_start : float, first julian date covered by the table
+            jd_end : float, last julian date covered by the table
+            seg_days : float, segment length [days]
+            deg : int, degree of the Chebyshev series on each segment, >= 1
+            ncheck : int, number of equally spaced points per segment at which
+                the fit is compared against `solar.sun_pos`
+        Output:
+            SunEphemeris
+        """
+        if deg < 1:
+            raise ValueError(f"deg must be >= 1, got {deg}")
+        nseg = max(int(np.ceil((jd_end - jd_start) / seg_days)), 1)
+        npts = deg + 1
+        # Chebyshev nodes on [-1, 1] and the discrete cosine transform matrix
+        k = np.arange(npts)
+        theta = np.pi * (k + 0.5) / npts
+        x = np.cos(theta)
+        T = np.cos(np.outer(k, theta)) * (2.0 / npts)
+        T[0] *= 0.5
+        mid = jd_start + (np.arange(nseg) + 0.5) * seg_days
+        jdt = mid[:, None] + 0.5 * seg_days * x  # (nseg, npts)
+        rsun = solar.sun_pos(jdt)  # (nseg, npts, 3)
+        coef = np.einsum("jk,skd->sjd", T, rsun)
+        eph = cls(coef, jd_start, seg_days)
+        # sample every segment between the nodes to bound the fit error
+        jdt = jd_start + np.linspace(0, nseg * seg_days, nseg * ncheck + 1)
+        diff = eph(jdt) - solar.sun_pos(jdt)
+        eph.err = np.sqrt(np.max(np.sum(diff * diff, axis=1)))
+        return eph
+
+    def save(self, filename):
+        """Write the table to a .npy file that can be memory-mapped by `load`.
+        The first row of the array holds [jd0, seg_days, err] so the file is
+        self-describing.
+        """
+        data = np.zeros((self.nseg + 1,) + self.coef.shape[1:])
+        data[0, 0, :] = self.jd0, self.seg_days, self.err
+        data[1:] = self.coef
+        np.save(filename, data)
+
+    @classmethod
+    def load(cls, filename, mmap_mode="r"):
+        """Open a table written by `save`, memory-mapped read-only by default"""
+        data = np.load(filename, mmap_mode=mmap_mode)
+        jd0, seg_days, err = data[0, 0, :]
+        return cls(data[1:], jd0, seg_days, err)
+
+    def __call__(self, jdt, out=None):
+        """Evaluate the sun position vector
+
+        Args:
+            jdt : float (...) or timefn.JulianDate, array or scalar of julian
+                dates inside the span of the table
+            out : float (..., 3), optional C-contiguous output array
+        Output:
+            r : float (..., 3), position vector of sun in ECI coordinates [km]
+        """
+        days = timefn.days_since(jdt, self.jd0)
+        shape = days.shape
+        days = days.reshape(-1)
+        # compare the dates, not the segment index, which floors dates up to
+        # a segment past the end onto the last segment
+        if not np.all((days >= 0) & (days <= self.nseg * self.seg_days)):
+            raise ValueError(
+                f"julian dates outside of ephemeris span [{self.jd0}, {self.jd1}]"
+            )
+        s = np.floor(days / self.seg_days)
+        s = np.minimum(s, self.nseg - 1).astype(np.intp)  # include jd1
+        x = 2.0 * (days - s * self.seg_days) / self.seg_days - 1.0
+        x2 = 2.0 * x
+        out = check_out(out, shape + (3,))
+        r = out.reshape(-1, 3)
+        # Clenshaw recurrence on each component, gathering one coefficient
+        # at a time so no (..., deg+1, 3) block is materialized
+        coef = self.coef
+        tmp = np.empty_like(x)
+        for d in range(3):
+            b1 = np.take(coef[:, self.deg, d], s)
+            b2 = np.zeros_like(x)
+            for j in range(self.deg - 1, 0, -1):
+                np.multiply(x2, b1, out=tmp)
+                tmp -= b2
+                tmp += np.take(coef[:, j, d], s)
+                b2, b1, tmp = b1, tmp, b2
+            b1 *= x
+            b1 -= b2
+            b1 += np.take(coef[:, 0, d], s)
+            r[:, d] = b1
+        return out
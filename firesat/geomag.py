@@ -0,0 +1,147 @@
+# Tilted dipole model of the geomagnetic field
+
+import functools
+import numpy as np
+from firesat import timescale
+from firesat.timefn import jd_join
+
+# IGRF-13 dipole coefficients at epoch 2020.0 [nT]
+IGRF_G10 = -29404.8
+IGRF_G11 = -1450.9
+IGRF_H11 = 4652.5
+R_REF = 6371.2  # [km] IGRF reference radius
+
+
+def dipole_vector(g10=IGRF_G10, g11=IGRF_G11, h11=IGRF_H11):
+    """Degree one Gauss coefficients as a vector in ECEF coordinates
+
+    Args:
+        g10, g11, h11 : float, dipole Gauss coefficients [nT]
+    Output:
+        g : float (3), (g11, h11, g10) [T]. The dipole moment points along -g,
+            the field at the surface ranges from |g| at the magnetic equator
+            to 2|g| at the magnetic poles.
+    """
+    return np.array([g11, h11, g10]) * 1e-9
+
+
+@functools.lru_cache(maxsize=8)
+def _ecef_rotation(jd_bytes, shape, scale):
+    jd = np.frombuffer(jd_bytes).reshape(shape)
+    theta = timescale.gmst(jd, scale)
+    c = np.cos(theta)
+    s = np.sin(theta)
+    R = np.zeros(shape + (3, 3))
+    R[..., 0, 0] = c
+    R[..., 0, 1] = s
+    R[..., 1, 0] = -s
+    R[..., 1, 1] = c
+    R[..., 2, 2] = 1.0
+    R.flags.writeable = False  # shared between calls
+    return R
+
+
+def ecef_rotation(jd, scale="utc"):
+    """Rotation matrices from ECI to ECEF coordinates about the Earth's axis.
+    The matrices of the most recent time grids are cached, so the attitude
+    models can evaluate many samples on one grid without recomputing them.
+
+    Args:
+        jd : float (n_t) or timefn.JulianDate, julian dates
+        scale : str, time scale of jd, see `timescale.convert`
+    Output:
+        R : float (n_t, 3, 3), read-only matrices, r_ecef = R @ r_eci
+    Notes:
+        Precession, nutation and polar motion are neglected, an error of well
+        under a degree in the dipole axis for dates near J2000.
+    """
+    jd = np.ascontiguousarray(jd_join(jd), dtype=float)
+    return _ecef_rotation(jd.tobytes(), jd.shape, scale)
+
+
+def dipole_eci(jd, scale="utc", g=None):
+    """Dipole vector in ECI coordinates at each time step
+
+    Args:
+        jd : float (n_t) or timefn.JulianDate, julian dates
+        scale : str, time scale of jd
+        g : float (3), dipole vector in ECEF from `dipole_vector`, defaults to
+            IGRF
+    Output:
+        g : float (n_t, 3), dipole vector in ECI [T], can be passed as g to
+            the field functions together with positions in ECI
+    """
+    if g is None:
+        g = dipole_vector()
+    # rotate the dipole into ECI once per time step instead of every
+    # position into ECEF
+    return np.einsum("tji,j->ti", ecef_rotation(jd, scale), g)
+
+
+def dipole_field(r, jd=None, scale="utc", g=None):
+    """Magnetic field of a tilted dipole
+
+    Args:
+        r : float (..., n_t, 3), position vectors [km], ECI if jd is given,
+            otherwise ECEF
+        jd : float (n_t) or timefn.JulianDate, julian dates of the time steps
+        scale : str, time scale of jd
+        g : float (3) or (n_t, 3), dipole vector in ECEF from
+            `dipole_vector`, or in ECI from `dipole_eci`, defaults to IGRF
+    Output:
+        B : float (..., n_t, 3), magnetic field in the frame of r [T]
+    References:
+        Wertz, Spacecraft Attitude Determination and Control, 1978, Sec. 5.1
+    """
+    r = np.asarray(r, dtype=float)
+    if jd is not None:
+        g = dipole_eci(jd, scale, g)
+    elif g is None:
+        g = dipole_vector()
+    rnorm = np.linalg.norm(r, axis=-1, keepdims=True)
+    u = r / rnorm
+    k = (R_REF / rnorm) ** 3
+    gu = np.sum(g * u, axis=-1, keepdims=True)
+    return k * (3 * gu * u - g)
+
+
+def field_magnitude(r, jd=None, scale="utc", g=None):
+    """Magnitude of the tilted dipole field
+
+    Args:
+        r : float (..., n_t, 3), position vectors [km], ECI if jd is given,
+            otherwise ECEF
+        jd : float (n_t) or timefn.JulianDate, julian dates of the time steps
+        scale : str, time scale of jd
+        g : float (3) or (n_t, 3), dipole vector in ECEF or ECI, see
+            `dipole_field`
+    Output:
+        B : float (..., n_t), |B| = |g| (R_REF/r)^3 sqrt(1 + 3 cos^2(psi)),
+            psi the angle between r and the dipole axis [T]
+    """
+    r = np.asarray(r, dtype=float)
+    if jd is not None:
+        g = dipole_eci(jd, scale, g)
+    elif g is None:
+        g = dipole_vector()
+    gnorm = np.linalg.norm(g, axis=-1)
+    rnorm = np.linalg.norm(r, axis=-1)
+    cpsi = np.sum(g * r, axis=-1) / (gnorm * rnorm)
+    return gnorm * (R_REF / rnorm) ** 3 * np.sqrt(1 + 3 * cpsi * cpsi)
+
+
+def dipole_torque(r, D, jd=None, scale="utc", g=None):
+    """Worst case torque on a residual dipole, perpendicular to the field
+
+    Args:
+        r : float (..., n_t, 3), position vectors [km], ECI if jd is given,
+            otherwise ECEF
+        D : float (...), residual dipole of the spacecraft [A m^2]
+        jd : float (n_t) or timefn.JulianDate, julian dates of the time steps
+        scale : str, time scale of jd
+        g : float (3) or (n_t, 3), dipole vector in ECEF or ECI, see
+            `dipole_field`
+    Output:
+        tau_m : float (..., n_t), magnetic torque D*|B| [N m]
+    """
+    return np.asarray(D, dtype=float)[..., None] * field_magnitude(r, jd, scale, g)
@@ -1,8 +1,10 @@
 import numpy as np
 from firesat import sgp4, solar, timefn
+import firesat.atmosphere as atmos
+from firesat.beta import eclipse_fraction
 import firesat.constants as cst
 
-def orbit(x, var_info, fidelity=0):
+def orbit(x, var_info, fidelity=0, **kwargs):
     """Calculate the orbit of the satellite based on the height.
 
     Parameters
@@ -15,6 +17,13 @@ def orbit(x, var_info, fidelity=0):
     var_info : dict
         Dictionary containing fixed parameters for problem
 
+    **kwargs :
+        Optional keyword arguments
+        beta : (float or np.ndarray (n)) solar beta angle [rad] used by the
+            low fidelity eclipse time, see `firesat.beta`. Defaults to 0, the
+            worst case eclipse. Only valid with fidelity 0, the high fidelity
+            eclipse follows from the propagated orbit and the sun.
+
     Returns
     -------
     q : np.ndarray (4, n)
@@ -48,47 +57,35 @@ def orbit(x, var_info, fidelity=0):
         H, phi = x
         n = x.shape[1]
 
+    if fidelity != 0 and kwargs.get("beta") is not None:
+        raise ValueError("beta is only used by the fidelity 0 orbit model")
+
     # Compute Orbit Subsystem Outputs
     if fidelity == 0:
         # Low fidelity model
         v = np.sqrt(mu / (RE + H))
         dt_orbit = 2 * np.pi * (RE + H) / v
-        dt_eclipse = dt_orbit / np.pi * np.arcsin(RE / (RE + H))
+        beta = kwargs.get("beta")
+        if beta is None:
+            dt_eclipse = dt_orbit / np.pi * np.arcsin(RE / (RE + H))
+        else:
+            dt_eclipse = dt_orbit * eclipse_fraction(beta, H, RE)
         theta_slew = np.arctan(np.sin(phi / RE) / (1 - np.cos(phi / RE) + H / RE))
     else:
         # Compute high fidelity model
-        # mean motion [rev/min]
-        no = np.sqrt(mu / ((RE + H) ** 3)) * 60
         # propagate using sgp4
         t = np.linspace(0, 1440, 1441)
-        tsize = t.size
-        satrec = sgp4.Satellite()
+        r_traj, v_traj, epoch = propagate(H, var_info, t)
         v_all = np.empty(n)
         dt_orbit_all = np.empty(n)
         dt_eclipse_all = np.empty(n)
         theta_slew_all = np.empty(n)
+        # every sample shares the epoch, so the sun vectors are computed once
+        jdt = timefn.jdt_tsince(timefn.jd_split(cst.J2000, epoch), t)
+        rsun = solar.sun_pos(jdt, scale="utc")  # TLE epochs are UTC
         for i in range(n):
-            satrec.no = no[i]
-            sgp4.sgp4init(
-                satrec.whichconst,
-                False,  # afspc_mode = False
-                satrec.satnum,
-                satrec.epoch,
-                satrec.bstar,
-                satrec.ecco,
-                satrec.argpo,
-                satrec.inclo,
-                satrec.mo,
-                satrec.no,
-                satrec.nodeo,
-                satrec,
-            )
-            r = np.empty((tsize, 3))
-            v = np.empty((tsize, 3))
-            for j in range(t.size):
-                ri, vi = sgp4.sgp4(satrec, t[j])
-                r[j] = ri
-                v[j] = vi
+            r = r_traj[i]
+            v = v_traj[i]
 
             # compute velocity
             vnorms = np.linalg.norm(v, axis=1)
@@ -104,15 +101,10 @@ def orbit(x, var_info, fidelity=0):
             dt_orbit_all[i] = dt_orbit_avg
 
             # compute eclipse time
-            epoch = satrec.epoch
-            jdt = timefn.jdt_tsince(epoch+cst.J2000, t)
-            rsun = solar.sun_pos(jdt)
-            # count the number of visible time steps per orbit
-            ecl = np.empty(len(idx)-1)
-            for j in range(len(idx)-1):
-                idx1, idx2 = idx[j], idx[j+1]
-                vis = solar.is_sat_illuminated(r[idx1:idx2], rsun[idx1:idx2])
-                ecl[j] = 1 - np.sum(vis.astype(int))/(idx2 - idx1)
+            # average the fraction of the sun occulted by the Earth per orbit,
+            # the penumbra contributes partial eclipse time
+            illum = solar.shadow_fraction(r[idx[0]:idx[-1]], rsun[idx[0]:idx[-1]])
+            ecl = 1 - np.add.reduceat(illum, idx[:-1] - idx[0]) / np.diff(idx)
             dt_eclipse_all[i] = np.mean(ecl) * dt_orbit_avg
 
             # compute slewing angle
@@ -127,9 +119,162 @@ def orbit(x, var_info, fidelity=0):
         theta_slew = theta_slew_all
 
     # Assemble Orbit outputs
-    q = np.zeros((4, n))
+    q = np.zeros((4, n), dtype=np.result_type(x, float))
     q[0] = v
     q[1] = dt_orbit
     q[2] = dt_eclipse
     q[3] = theta_slew
     return q
+
+
+def orbit_partials(x, var_info):
+    """Analytic partial derivatives of the low fidelity orbit model.
+
+    Parameters
+    ----------
+    x : np.ndarray (2, n)
+        Input design vars, H and phi, see `orbit`
+
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    Returns
+    -------
+    dq_dx : np.ndarray (4, 2, n)
+        Derivatives of v, dt_orbit, dt_eclipse and theta_slew, see `orbit`,
+        with respect to H and phi, for the worst case eclipse (beta = 0)
+    """
+    mu = var_info["mu"]
+    RE = var_info["RE"]
+    H, phi = x
+    r = RE + H
+    v = np.sqrt(mu / r)
+    dt_orbit = 2 * np.pi * r / v
+    s = RE / r
+    dq = np.zeros((4, 2, H.size), dtype=np.result_type(H, phi))
+    dq[0, 0] = -0.5 * v / r
+    dq[1, 0] = 1.5 * dt_orbit / r
+    dq[2, 0] = (dq[1, 0] * np.arcsin(s) - dt_orbit * s / (r * np.sqrt(1 - s * s))) / np.pi
+    # theta_slew = arctan(N/M)
+    N = np.sin(phi / RE)
+    M = 1 - np.cos(phi / RE) + H / RE
+    k = 1 / (RE * (N * N + M * M))
+    dq[3, 0] = -N * k
+    dq[3, 1] = (M * np.cos(phi / RE) - N * np.sin(phi / RE)) * k
+    return dq
+
+
+def propagate(H, var_info, t):
+    """Propagate circular orbits of the satellite with sgp4.
+
+    Parameters
+    ----------
+    H : np.ndarray (n)
+        Altitude [m]
+
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    t : np.ndarray (n_t)
+        Minutes since epoch
+
+    Returns
+    -------
+    r : np.ndarray (n, n_t, 3)
+        Position vectors in ECI coordinates [km]
+
+    v : np.ndarray (n, n_t, 3)
+        Velocity vectors in ECI coordinates [km/s]
+
+    epoch : float
+        Days since J2000 of the start of the trajectories (UTC)
+    """
+    mu = var_info["mu"]
+    RE = var_info["RE"]
+    H = np.atleast_1d(H)
+    n = H.size
+    # mean motion [rev/min]
+    no = np.sqrt(mu / ((RE + H) ** 3)) * 60
+    r = np.empty((n, t.size, 3))
+    v = np.empty((n, t.size, 3))
+    satrec = sgp4.Satellite()
+    for i in range(n):
+        satrec.no = no[i]
+        sgp4.sgp4init(
+            satrec.whichconst,
+            False,  # afspc_mode = False
+            satrec.satnum,
+            satrec.epoch,
+            satrec.bstar,
+            satrec.ecco,
+            satrec.argpo,
+            satrec.inclo,
+            satrec.mo,
+            satrec.no,
+            satrec.nodeo,
+            satrec,
+        )
+        for j in range(t.size):
+            r[i, j], v[i, j] = sgp4.sgp4(satrec, t[j])
+    return r, v, satrec.epoch
+
+
+def orbit_drag(h, v, offsets=None, rho=None):
+    """Orbit-averaged and peak atmospheric density and dynamic pressure along
+    trajectories, reduced per sample without a loop over samples.
+
+    Parameters
+    ----------
+    h : np.ndarray (n, n_t) or (m)
+        Altitude along each trajectory [m]. A 1d array holds the profiles of
+        all samples back to back, split at offsets.
+
+    v : np.ndarray, same shape as h
+        Speed relative to the atmosphere along each trajectory [m/s]
+
+    offsets : np.ndarray (n), optional
+        Index of the first point of each sample in a 1d h, for profiles of
+        different lengths, e.g. whole orbits cut from a cached profile.
+
+    rho : np.ndarray, same shape as h, optional
+        Density along the trajectories [kg/m^3], e.g. from
+        `atmosphere.harris_priester_density`. Defaults to
+        `atmosphere.exponential_density_model`.
+
+    Returns
+    -------
+    q : np.ndarray (4, n)
+        q[0] = rho_avg, time averaged density [kg/m^3]
+        q[1] = rho_max, peak density [kg/m^3]
+        q[2] = pdyn_avg, time averaged dynamic pressure 0.5*rho*v**2 [Pa]
+        q[3] = pdyn_max, peak dynamic pressure [Pa]
+
+    Notes
+    -----
+    The points of a trajectory are assumed equally spaced in time. For orbit
+    averages, the profiles should cover a whole number of orbits.
+    """
+    h = np.asarray(h, dtype=float)
+    v = np.asarray(v, dtype=float)
+    if offsets is None:
+        if h.ndim == 1:
+            h = h[None, :]
+            v = v[None, :]
+        offsets = np.arange(0, h.size, h.shape[-1])
+    offsets = np.asarray(offsets, dtype=np.intp)
+    h = h.reshape(-1)
+    v = v.reshape(-1)
+    if rho is None:
+        rho = atmos.exponential_density_model(h / 1000)
+    else:
+        rho = np.asarray(rho, dtype=float).reshape(-1)
+    count = np.diff(np.append(offsets, h.size))
+    pdyn = v * v
+    pdyn *= 0.5
+    pdyn *= rho
+    q = np.empty((4, offsets.size))
+    np.divide(np.add.reduceat(rho, offsets), count, out=q[0])
+    np.maximum.reduceat(rho, offsets, out=q[1])
+    np.divide(np.add.reduceat(pdyn, offsets), count, out=q[2])
+    np.maximum.reduceat(pdyn, offsets, out=q[3])
+    return q
@@ -1,7 +1,18 @@
+import functools
 import numpy as np
+from collections import namedtuple
+import firesat.solar as solar
+import firesat.complex_step as cs
+from firesat.buffers import check_out
+from firesat.constants import BLOCK
 
+PowerConstants = namedtuple(
+    "PowerConstants",
+    ["cos_i", "area", "length", "width", "mass", "D", "t", "I_body"],
+)
 
-def power(x, y, var_info, fidelity=0, **kwargs):
+
+def power(x, y, var_info, fidelity=0, out=None, constants=None, work=None, **kwargs):
     """Power model to compute the size of solar array required to power
     satellite. Takes the power requirements from the attitude model and the
     orbit and eclipse time from the orbit model. Outputs the moments of inertia
@@ -23,12 +34,29 @@ def power(x, y, var_info, fidelity=0, **kwargs):
     var_info : dict
         Dictionary containing fixed parameters for problem
 
+    out : np.ndarray (4, n), optional
+        C-contiguous array the outputs are written to
+
+    constants : PowerConstants, optional
+        Scalar factors from `power_constants(var_info)`, computed once and
+        reused over repeated calls with the same var_info
+
+    work : np.ndarray (3, m), optional
+        C-contiguous work space reused across calls, samples are evaluated
+        in blocks of m. Defaults to a new array for blocks of `constants.BLOCK` samples.
+
     **kwargs :
         Optionary keyword arguments to select high fidelity computation
         fidelity : (int)
             0 = lowest fidelity  (default)
-            1 = medium fidelity
-            2 = high fidelity
+            1 = medium fidelity, exact inertia of n_sa panels, var_info
+                sa_layout selects the panel layout
+            2 = high fidelity, meshed panels in the same layout
+        cos_i : (float or np.ndarray (n)) mean cosine of the sun incidence
+            angle on the array in sunlight, replaces cos(sun_i)
+        r_traj, v_traj, rsun : trajectories and sun vectors to compute cos_i
+            along the orbit with `array_incidence`, for the array pointing
+            var_info sa_pointing
 
     Returns
     -------
@@ -38,21 +66,15 @@ def power(x, y, var_info, fidelity=0, **kwargs):
         q[1] = A_sa
         q[2] = I_max
         q[3] = I_min
+
+    Notes
+    -----
+    The low fidelity model is fused into a single pass over blocks of
+    samples, so apart from out and work no arrays of the sample size are
+    allocated. The inputs are never modified.
     """
-    # Setup fixed input variables
-    sun_i = var_info["sun_i"]
-    I_d = var_info["I_d"]
-    nu = var_info["nu"]
-    LT = var_info["LT"]
-    eps_deg = var_info["eps_deg"]
-    r_lw = var_info["r_lw"]
-    n_sa = var_info["n_sa"]
-    rho_sa = var_info["rho_sa"]
-    t = var_info["t"]
-    D = var_info["D"]
-    I_bodyx = var_info["I_bodyx"]
-    I_bodyy = var_info["I_bodyy"]
-    I_bodyz = var_info["I_bodyz"]
+    if constants is None:
+        constants = power_constants(var_info)
 
     # Unpack design variables
     Po, F_s = x
@@ -60,53 +82,302 @@ def power(x, y, var_info, fidelity=0, **kwargs):
     # Unpack coupling variables
     PACS, dt_orbit, dt_eclipse = y
 
+    if "cos_i" in kwargs:
+        cos_i = kwargs["cos_i"]
+    elif "r_traj" in kwargs:
+        # incidence along the orbit, averaged over the sunlit time steps
+        cos_i = array_incidence(
+            kwargs["r_traj"],
+            kwargs["v_traj"],
+            kwargs["rsun"],
+            var_info.get("sa_pointing", "track"),
+        )[0]
+    else:
+        cos_i = constants.cos_i
+
     # Compute output quantitites
-    P_tot = PACS + Po
-    T_e = dt_eclipse
-    T_d = dt_orbit - T_e
-    P_e = P_tot
-    P_d = P_tot
-    P_sa = (P_e * T_e / 0.6 + P_d * T_d / 0.8) / T_d
-    PBOL = nu * F_s * I_d * np.cos(sun_i)
-    PEOL = PBOL * (1 - eps_deg) ** (LT)
-    A_sa = P_sa / PEOL
+    nsamp = x.shape[1]  # number of samples
+    # complex inputs are kept for complex step derivatives
+    dtype = np.result_type(x, y, cos_i, float)
+    out = check_out(out, (4, nsamp), dtype=dtype)
+    if work is None:
+        work = np.empty((3, max(min(nsamp, BLOCK), 1)), dtype=dtype)
+    elif (
+        work.ndim != 2
+        or work.shape[0] != 3
+        or work.shape[1] < 1
+        or not work.flags.c_contiguous
+        or work.dtype != dtype
+    ):
+        raise ValueError(f"work must be a C-contiguous {dtype} array of shape (3, m)")
+    args = [
+        np.broadcast_to(np.asarray(a, dtype=dtype), (nsamp,))
+        for a in (Po, F_s, PACS, dt_orbit, dt_eclipse, cos_i)
+    ]
+    nb = work.shape[1]
+    for start in range(0, nsamp, nb):
+        stop = min(start + nb, nsamp)
+        _power_block(
+            [a[start:stop] for a in args],
+            constants,
+            fidelity == 0,
+            out[:, start:stop],
+            work[:, :stop - start],
+        )
+    if fidelity == 0:
+        return out
 
     # Compute solar array geometry quantities
-    L = np.sqrt(A_sa * r_lw / n_sa)
+    n_sa = var_info["n_sa"]
+    r_lw = var_info["r_lw"]
+    A_sa = out[1]
+    L = np.sqrt(A_sa * (r_lw / n_sa))
     W = np.sqrt(A_sa / (r_lw * n_sa))
+    I_bodyx, I_bodyy, I_bodyz = constants.I_body
 
-    if fidelity > 0:
+    if fidelity >= 2:
         # use high fidelity computation
-        out = inertia_high_fidelity(W, L, D, t, rho_sa, n_sa)
-        I_sax, I_say, I_saz, m_sa = out
+        I_sax, I_say, I_saz, _ = inertia_high_fidelity(
+            W, L, constants.D, constants.t, var_info["rho_sa"], n_sa,
+            var_info.get("sa_layout", "star"),
+        )
+        I_x = I_sax + I_bodyx
+        I_y = I_say + I_bodyy
+        I_z = I_saz + I_bodyz
+        np.maximum(I_x, I_y, out=out[2])
+        np.maximum(out[2], I_z, out=out[2])
+        np.minimum(I_x, I_y, out=out[3])
+        np.minimum(out[3], I_z, out=out[3])
 
     else:
-        # use low fidelity calculation
-        out = inertia_low_fidelity(W, L, D, t, rho_sa, n_sa)
-        I_sax, I_say, I_saz, m_sa = out
+        # use medium fidelity calculation, principal moments of the
+        # satellite body and all panels
+        I_sa, _, _ = inertia_medium_fidelity(
+            W, L, constants.D, constants.t, var_info["rho_sa"], n_sa,
+            var_info.get("sa_layout", "star"),
+        )
+        I_p = np.linalg.eigvalsh(I_sa + np.diag(constants.I_body))  # ascending
+        out[2] = I_p[:, 2]
+        out[3] = I_p[:, 0]
+    return out
 
-    # print(f'I_sa x, y, z = {I_sax.mean()}, {I_say.mean()}, {I_saz.mean()}')
 
-    I_sax += I_bodyx
-    I_say += I_bodyy
-    I_saz += I_bodyz
+def array_power(A_sa, F_s, var_info, constants=None, cos_i=None):
+    """End of life output of the solar array in full sunlight, the P_sa
+    from which `power` sizes the array.
 
-    I_tot = np.array([I_sax, I_say, I_saz]).T
-    if len(I_tot.shape) > 1:
-        I_max = np.amax(I_tot, axis=1)
-        I_min = np.amin(I_tot, axis=1)
-    else:
-        I_max = np.amax(I_tot, axis=0)
-        I_min = np.amin(I_tot, axis=0)
-
-    # Assemble Power outputs
-    n = x.shape[1]  # number of samples
-    q = np.zeros((4, n))
-    q[0] = P_tot
-    q[1] = A_sa
-    q[2] = I_max
-    q[3] = I_min
-    return q
+    Parameters
+    ----------
+    A_sa : np.ndarray (n)
+        Solar array area [m^2], q[1] of `power`
+
+    F_s : np.ndarray (n)
+        Solar flux [W/m^2], x[1] of `power`
+
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    constants : PowerConstants, optional
+        Scalar factors from `power_constants(var_info)`
+
+    cos_i : float or np.ndarray (n), optional
+        Mean cosine of the sun incidence angle used by `power`, defaults to
+        cos(sun_i)
+
+    Returns
+    -------
+    P_sa : np.ndarray (n)
+        Array output A_sa*PEOL [W], e.g. for `battery_soc`
+    """
+    if constants is None:
+        constants = power_constants(var_info)
+    if cos_i is None:
+        cos_i = constants.cos_i
+    # A_sa = area*P_sa/(F_s*cos_i), see `_power_block`
+    return A_sa * F_s * cos_i / constants.area
+
+
+def power_constants(var_info):
+    """Combine the fixed parameters of the power model into the scalar
+    factors used by every sample.
+
+    Parameters
+    ----------
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    Returns
+    -------
+    constants : PowerConstants
+        Scalar factors of the array sizing and inertia equations, can be
+        passed to `power` to skip recomputing them
+    """
+    n_sa = var_info["n_sa"]
+    r_lw = var_info["r_lw"]
+    t = var_info["t"]
+    return PowerConstants(
+        cos_i=np.cos(var_info["sun_i"]),
+        area=1 / (var_info["nu"] * var_info["I_d"] * (1 - var_info["eps_deg"]) ** var_info["LT"]),
+        length=r_lw / n_sa,
+        width=1 / (r_lw * n_sa),
+        mass=var_info["rho_sa"] * t / n_sa,
+        D=var_info["D"],
+        t=t,
+        I_body=(var_info["I_bodyx"], var_info["I_bodyy"], var_info["I_bodyz"]),
+    )
+
+
+def power_partials(x, y, var_info, constants=None, cos_i=None):
+    """Analytic partial derivatives of the low fidelity power model.
+
+    Parameters
+    ----------
+    x : np.ndarray (2, n)
+        Input design variables, Po and F_s, see `power`
+
+    y : np.ndarray (3, n)
+        Input coupling variables, PACS, dt_orbit and dt_eclipse
+
+    var_info : dict
+        Dictionary containing fixed parameters for problem
+
+    constants : PowerConstants, optional
+        Scalar factors from `power_constants(var_info)`
+
+    cos_i : float or np.ndarray (n), optional
+        Mean cosine of the sun incidence angle, defaults to cos(sun_i)
+
+    Returns
+    -------
+    dq_dx : np.ndarray (4, 2, n)
+        Derivatives of P_tot, A_sa, I_max and I_min with respect to x
+
+    dq_dy : np.ndarray (4, 3, n)
+        Derivatives of P_tot, A_sa, I_max and I_min with respect to y
+
+    Notes
+    -----
+    I_max and I_min are the largest and smallest of the three moments of
+    the satellite, their derivatives are those of the selected moments.
+    """
+    if constants is None:
+        constants = power_constants(var_info)
+    if cos_i is None:
+        cos_i = constants.cos_i
+    Po, F_s = x
+    PACS, dt_orbit, dt_eclipse = y
+    dtype = np.result_type(x, y)
+    n = x.shape[1]
+
+    # forward pass, see `_power_block`
+    P_tot = PACS + Po
+    T_d = dt_orbit - dt_eclipse
+    f = dt_eclipse / (0.6 * T_d) + 1 / 0.8  # P_sa / P_tot
+    A_sa = constants.area * P_tot * f / (F_s * cos_i)
+    m_sa = constants.mass * A_sa
+    L2 = constants.length * A_sa
+    W2 = constants.width * A_sa
+    t2 = constants.t * constants.t / 12
+    d = constants.D + 0.5 * np.sqrt(L2)  # distance of the panel center
+    I = np.stack(
+        [
+            m_sa * (L2 / 12 + t2 + d * d) + constants.I_body[0],
+            m_sa * (W2 / 12 + t2) + constants.I_body[1],
+            m_sa * ((L2 + W2) / 12 + d * d) + constants.I_body[2],
+        ]
+    )
+    # derivatives of the moments with respect to A_sa
+    dd2 = d * constants.length / (2 * np.sqrt(L2))  # d(d**2)/dA_sa
+    dI = np.stack(
+        [
+            constants.mass * (L2 / 12 + t2 + d * d) + m_sa * (constants.length / 12 + dd2),
+            constants.mass * (W2 / 12 + t2) + m_sa * constants.width / 12,
+            constants.mass * ((L2 + W2) / 12 + d * d)
+            + m_sa * ((constants.length + constants.width) / 12 + dd2),
+        ]
+    )
+    i = np.arange(n)
+    dI_max = dI[np.argmax(np.real(I), axis=0), i]
+    dI_min = dI[np.argmin(np.real(I), axis=0), i]
+
+    # derivatives of A_sa
+    dA_dx = np.stack([A_sa / P_tot, -A_sa / F_s])
+    df = np.stack([-dt_eclipse, dt_orbit]) / (0.6 * T_d * T_d)  # df/d(dt_orbit, dt_eclipse)
+    dA_dy = np.stack([A_sa / P_tot, A_sa / f * df[0], A_sa / f * df[1]])
+
+    dq_dx = np.zeros((4, 2, n), dtype=dtype)
+    dq_dy = np.zeros((4, 3, n), dtype=dtype)
+    dq_dx[0, 0] = 1.0
+    dq_dy[0, 0] = 1.0
+    dq_dx[1] = dA_dx
+    dq_dy[1] = dA_dy
+    dq_dx[2] = dI_max * dA_dx
+    dq_dy[2] = dI_max * dA_dy
+    dq_dx[3] = dI_min * dA_dx
+    dq_dy[3] = dI_min * dA_dy
+    return dq_dx, dq_dy
+
+
+def _power_block(args, const, inertia, out, scratch):
+    """Evaluate the power outputs for one block of samples in place.
+
+    Parameters
+    ----------
+    args : list of np.ndarray (m)
+        Po, F_s, PACS, dt_orbit, dt_eclipse and cos_i for the block
+    const : PowerConstants
+        Scalar factors from `power_constants`
+    inertia : bool
+        Also evaluate I_max and I_min of the low fidelity model
+    out : np.ndarray (4, m)
+        Output rows for P_tot, A_sa, I_max and I_min
+    scratch : np.ndarray (3, m)
+        Work space
+    """
+    Po, F_s, PACS, dt_orbit, dt_eclipse, cos_i = args
+    s1, s2, s3 = scratch
+    P_tot, A_sa, I_max, I_min = out
+    np.add(PACS, Po, out=P_tot)
+    # array power to cover daylight and eclipse through the path
+    # efficiencies, P_sa = P_tot*(T_e/0.6 + T_d/0.8)/T_d
+    np.subtract(dt_orbit, dt_eclipse, out=s1)
+    np.divide(dt_eclipse, s1, out=s1)
+    s1 *= 1 / 0.6
+    s1 += 1 / 0.8
+    s1 *= P_tot
+    # array area from the end of life power per unit area
+    np.multiply(F_s, cos_i, out=A_sa)
+    np.divide(s1, A_sa, out=A_sa)
+    A_sa *= const.area
+    if not inertia:
+        return
+    # low fidelity panel inertia, see `inertia_low_fidelity`, with
+    # m_sa = rho_sa*L*W*t and L*W = A_sa/n_sa
+    t2 = const.t * const.t / 12
+    np.multiply(A_sa, const.mass, out=s1)  # m_sa
+    np.multiply(A_sa, const.length, out=s2)  # L**2
+    np.sqrt(s2, out=s3)
+    s3 *= 0.5
+    s3 += const.D
+    s3 *= s3  # (D + L/2)**2
+    s2 *= 1 / 12
+    s2 += s3
+    np.multiply(A_sa, const.width / 12, out=s3)  # W**2/12
+    I_bodyx, I_bodyy, I_bodyz = const.I_body
+    np.add(s2, t2, out=I_max)
+    I_max *= s1
+    I_max += I_bodyx  # I_x
+    np.add(s2, s3, out=I_min)
+    I_min *= s1
+    I_min += I_bodyz  # I_z
+    np.add(s3, t2, out=s2)
+    s2 *= s1
+    s2 += I_bodyy  # I_y
+    # pairwise extremes of the three moments
+    cs.minimum(I_max, I_min, out=s3)
+    cs.maximum(I_max, I_min, out=I_max)
+    cs.maximum(I_max, s2, out=I_max)
+    cs.minimum(s3, s2, out=I_min)
 
 
 def inertia_low_fidelity(W, L, D, t, rho_sa, n_sa):
@@ -118,91 +389,486 @@ def inertia_low_fidelity(W, L, D, t, rho_sa, n_sa):
     return I_sax, I_say, I_saz, m_sa
 
 
-def inertia_high_fidelity(W, L, D, t, rho_sa, n_sa):
+def inertia_medium_fidelity(W, L, D, t, rho_sa, n_sa, layout="star"):
+    """Exact inertia tensor of n_sa rectangular solar panels from the
+    parallel axis theorem.
+
+    Parameters
+    ----------
+    W, L : np.ndarray (n)
+        Width and length of each panel [m]
+
+    D : float
+        Distance from the body axis to the root of each wing [m]
+
+    t : float
+        Panel thickness [m]
+
+    rho_sa : float
+        Panel density [kg/m^3]
+
+    n_sa : int
+        Number of panels
+
+    layout : str
+        Arrangement of the panels in the x-y plane, each panel extends along
+        its wing with its width in the plane
+        'star' : one panel per wing, wings evenly spaced around the z axis
+            starting at +y
+        'wings' : two wings along +y and -y, the panels split between them
+            and mounted end to end
+        'inline' : one wing along +y with all panels end to end
+
+    Returns
+    -------
+    I : np.ndarray (n, 3, 3)
+        Inertia tensor of the panels about the body origin [kg m^2]
+
+    I_p : np.ndarray (n, 3)
+        Principal moments of inertia in ascending order [kg m^2]
+
+    m_sa : np.ndarray (n)
+        Mass of all panels [kg]
+
+    Notes
+    -----
+    With one panel every layout reduces to `inertia_low_fidelity`.
+    """
+    W = np.asarray(W, dtype=float)
+    L = np.asarray(L, dtype=float)
+    angle, pos = _panel_layout(n_sa, layout)
+    m = rho_sa * L * W * t  # mass of one panel
+    # centroidal moments of one panel about its width, length and normal
+    Ic = np.stack((L * L + t * t, W * W + t * t, W * W + L * L), axis=-1)
+    Ic *= (m / 12)[..., None]
+    I = np.zeros(W.shape + (3, 3))
+    for k in range(n_sa):
+        c, s = np.cos(angle[k]), np.sin(angle[k])
+        # wing direction is (-s, c, 0), the panel width along (c, s, 0)
+        R = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1.0]])
+        Ik = np.einsum("ij,...j,kj->...ik", R, Ic, R)
+        # distance of the panel centroid from the body axis
+        d = D + (pos[k] + 0.5) * L
+        Ik[..., 0, 0] += m * d * d * c * c
+        Ik[..., 1, 1] += m * d * d * s * s
+        Ik[..., 2, 2] += m * d * d
+        Ik[..., 0, 1] += m * d * d * c * s
+        Ik[..., 1, 0] += m * d * d * c * s
+        I += Ik
+    return I, np.linalg.eigvalsh(I), n_sa * m
+
+
+def inertia_high_fidelity(W, L, D, t, rho_sa, n_sa, layout="star"):
     """Hi-fidelity inertia tensor calculation using tetgen to
     create a 3D tetrahedron mesh of the solar panels. Then
     compute the intertia tensor from the sum of the element
     interias
+
+    The panels are boxes of the same topology, so a unit panel is meshed
+    once and its volume moments are mapped to each sample's (W, L, D, t)
+    by `affine_inertia`, without meshing per sample. The n_sa panels are
+    placed as in `inertia_medium_fidelity` for the given layout.
+    """
+    W = np.asarray(W, dtype=float)
+    L = np.asarray(L, dtype=float)
+    angle, pos = _panel_layout(n_sa, layout)
+    moments = _unit_panel_moments()
+    scale = np.stack(np.broadcast_arrays(W, L, t), axis=-1)
+    zeros = np.zeros_like(scale[..., 0])
+    I = np.zeros(scale.shape[:-1] + (3, 3))
+    m_sa = np.zeros(scale.shape[:-1])
+    for k in range(n_sa):
+        # root of the panel on its wing, before turning the wing about z
+        offset = np.stack((zeros, D + pos[k] * L + zeros, zeros), axis=-1)
+        m, Ik = affine_inertia(moments, scale, offset, rho_sa)
+        c, s = np.cos(angle[k]), np.sin(angle[k])
+        R = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1.0]])
+        I += np.einsum("ij,...jl,kl->...ik", R, Ik, R)
+        m_sa += m
+    I_sax = I[..., 0, 0]
+    I_say = I[..., 1, 1]
+    I_saz = I[..., 2, 2]
+    return I_sax, I_say, I_saz, m_sa
+
+
+def _panel_layout(n_sa, layout):
+    """Angle of the wing about the z axis from +y and index along the wing
+    of each panel, see `inertia_medium_fidelity` for the layouts
+    """
+    if layout == "star":
+        angle = 2 * np.pi * np.arange(n_sa) / n_sa
+        pos = np.zeros(n_sa)  # panel index along its wing
+    elif layout == "wings":
+        angle = np.pi * (np.arange(n_sa) % 2)
+        pos = np.arange(n_sa) // 2
+    elif layout == "inline":
+        angle = np.zeros(n_sa)
+        pos = np.arange(n_sa)
+    else:
+        raise ValueError(f"unknown solar array layout '{layout}'")
+    return angle, pos
+
+
+@functools.lru_cache(maxsize=None)
+def _unit_panel_moments():
+    """Volume moments of a tetgen mesh of the unit panel,
+    [-1/2, 1/2] x [0, 1] x [-1/2, 1/2], meshed once and cached
     """
     import tetgen
 
-    I_sax = np.zeros(W.size)
-    I_say = np.zeros(W.size)
-    I_saz = np.zeros(W.size)
-    m_sa = np.zeros(W.size)
-    for i in range(W.size):
-        Wi = W[i]
-        Li = L[i]
-        # set vertices
-        verts = np.array(
-            [
-                [-Wi / 2, D, t / 2],
-                [Wi / 2, D, t / 2],
-                [Wi / 2, D, -t / 2],
-                [-Wi / 2, D, -t / 2],
-                [-Wi / 2, D + Li, t / 2],
-                [Wi / 2, D + Li, t / 2],
-                [Wi / 2, D + Li, -t / 2],
-                [-Wi / 2, D + Li, -t / 2],
-            ]
-        )
-        # set facets
-        facets = np.array(
-            [
-                [0, 1, 2],
-                [0, 2, 3],
-                [0, 1, 5],
-                [0, 5, 4],
-                [0, 3, 7],
-                [0, 4, 7],
-                [1, 2, 5],
-                [2, 5, 6],
-                [3, 2, 6],
-                [3, 6, 7],
-                [4, 5, 6],
-                [4, 6, 7],
-            ]
-        )
-        tet = tetgen.TetGen(verts, facets)
-        nodes, elems = tet.tetrahedralize(quality=1, verbose=0)
-        # Compute inertia tensor from tetrahedrons
-        nelem = elems.shape[0]
-        dIxx = np.zeros(nelem)
-        dIyy = np.zeros(nelem)
-        dIzz = np.zeros(nelem)
-        dMass = np.zeros(nelem)
-        for j, el in enumerate(elems):
-            # Gather element nodes
-            pts = nodes[el]
-            a = pts[0]
-            b = pts[1]
-            c = pts[2]
-            d = pts[3]
-            # Find centroid x, y, z coordinates
-            xx = (a[0] + b[0] + c[0] + d[0]) / 4.0
-            yy = (a[1] + b[1] + c[1] + d[1]) / 4.0
-            zz = (a[2] + b[2] + c[2] + d[2]) / 4.0
-            # Find element volume
-            dV = (
-                1
-                / 6.0
-                * abs(
-                    (a[0] - d[0])
-                    * ((b[1] - d[1]) * (c[2] - d[2]) - (b[2] - d[2]) * (c[1] - d[1]))
-                    + (a[1] - d[1])
-                    * ((b[2] - d[2]) * (c[0] - d[0]) - (b[0] - d[0]) * (c[2] - d[2]))
-                    + (a[2] - d[2])
-                    * ((b[0] - d[0]) * (c[1] - d[1]) - (b[1] - d[1]) * (c[0] - d[0]))
-                )
-            )
-            # Compute element inertia
-            dMass[j] = rho_sa * dV
-            dIxx[j] = rho_sa * dV * (yy * yy + zz * zz)
-            dIyy[j] = rho_sa * dV * (xx * xx + zz * zz)
-            dIzz[j] = rho_sa * dV * (xx * xx + yy * yy)
-        I_sax[i] = np.sum(dIxx) ** 2
-        I_say[i] = np.sum(dIyy) ** 2
-        I_saz[i] = np.sum(dIzz) ** 2
-        m_sa[i] = np.sum(dMass)
+    # set vertices
+    verts = np.array(
+        [
+            [-0.5, 0, 0.5],
+            [0.5, 0, 0.5],
+            [0.5, 0, -0.5],
+            [-0.5, 0, -0.5],
+            [-0.5, 1, 0.5],
+            [0.5, 1, 0.5],
+            [0.5, 1, -0.5],
+            [-0.5, 1, -0.5],
+        ]
+    )
+    # set facets
+    facets = np.array(
+        [
+            [0, 1, 2],
+            [0, 2, 3],
+            [0, 1, 5],
+            [0, 5, 4],
+            [0, 3, 7],
+            [0, 4, 7],
+            [1, 2, 5],
+            [2, 5, 6],
+            [3, 2, 6],
+            [3, 6, 7],
+            [4, 5, 6],
+            [4, 6, 7],
+        ]
+    )
+    tet = tetgen.TetGen(verts, facets)
+    nodes, elems = tet.tetrahedralize(quality=1, verbose=0)[:2]
+    moments = tuple(np.asarray(a) for a in mesh_moments(nodes, elems))
+    for a in moments:
+        a.flags.writeable = False  # shared between calls
+    return moments
 
-    return I_sax, I_say, I_saz, m_sa
+
+def mesh_moments(nodes, elems):
+    """Volume, first and second volume moments of a tetrahedral mesh
+
+    Parameters
+    ----------
+    nodes : np.ndarray (n_node, 3) or (..., n_node, 3)
+        Node coordinates [m], a batch of meshes can share the same elements
+
+    elems : np.ndarray (n_elem, 4)
+        Node indices of each tetrahedron
+
+    Returns
+    -------
+    V : np.ndarray () or (...)
+        Volume [m^3]
+
+    S : np.ndarray (3) or (..., 3)
+        First moments, S_i = int(x_i dV) [m^4]
+
+    C : np.ndarray (3, 3) or (..., 3, 3)
+        Second moments, C_ij = int(x_i*x_j dV) [m^5]
+
+    Notes
+    -----
+    The second moments of each tetrahedron are exact for a linear
+    tetrahedron with vertices p_k and volume V,
+    int(x_i*x_j dV) = V/20*(sum_k p_ki*p_kj + sum_k p_ki * sum_k p_kj).
+
+    References
+    ----------
+    Tonon, Explicit exact formulas for the 3-D tetrahedron inertia tensor in
+    terms of its vertex coordinates, Journal of Mathematics and Statistics,
+    2005
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    pts = nodes[..., elems, :]  # (..., n_elem, 4, 3)
+    edges = pts[..., 1:, :] - pts[..., :1, :]
+    vol = np.abs(np.linalg.det(edges)) / 6.0  # (..., n_elem)
+    s = pts.sum(axis=-2)  # (..., n_elem, 3)
+    w = vol / 20.0
+    C = np.einsum("...e,...eki,...ekj->...ij", w, pts, pts)
+    C += np.einsum("...e,...ei,...ej->...ij", w, s, s)
+    S = np.einsum("...e,...ei->...i", vol, s) / 4.0
+    return vol.sum(axis=-1), S, C
+
+
+def _inertia_from_moments(C):
+    """Inertia tensor from the second mass moments, I = tr(C)*E - C"""
+    I = -C
+    trace = np.trace(C, axis1=-2, axis2=-1)
+    for k in range(3):
+        I[..., k, k] += trace
+    return I
+
+
+def mesh_inertia(nodes, elems, rho):
+    """Mass and inertia tensor of a solid body of uniform density from a
+    tetrahedral mesh, about the origin of the node coordinates.
+
+    Parameters
+    ----------
+    nodes : np.ndarray (n_node, 3) or (..., n_node, 3)
+        Node coordinates [m], a batch of meshes can share the same elements
+
+    elems : np.ndarray (n_elem, 4)
+        Node indices of each tetrahedron
+
+    rho : float
+        Density [kg/m^3]
+
+    Returns
+    -------
+    m : float or np.ndarray (...)
+        Mass [kg]
+
+    I : np.ndarray (3, 3) or (..., 3, 3)
+        Inertia tensor [kg m^2], with the products of inertia off the
+        diagonal, I_xy = -int(x*y dm)
+    """
+    V, S, C = mesh_moments(nodes, elems)
+    return rho * V, _inertia_from_moments(rho * C)
+
+
+def affine_inertia(moments, scale, offset, rho):
+    """Mass and inertia tensor of a template body stretched along the
+    coordinate axes and translated, x' = scale*x + offset, computed from the
+    template's volume moments without remeshing.
+
+    Parameters
+    ----------
+    moments : tuple
+        (V, S, C) of the template from `mesh_moments`
+
+    scale : np.ndarray (3) or (..., 3)
+        Stretch factor along each axis
+
+    offset : np.ndarray (3) or (..., 3)
+        Translation [m]
+
+    rho : float
+        Density [kg/m^3]
+
+    Returns
+    -------
+    m : np.ndarray (...)
+        Mass [kg]
+
+    I : np.ndarray (..., 3, 3)
+        Inertia tensor about the origin [kg m^2]
+    """
+    V, S, C = moments
+    scale = np.asarray(scale, dtype=float)
+    offset = np.asarray(offset, dtype=float)
+    J = rho * np.prod(scale, axis=-1)  # mass per template volume
+    # int(x'_i x'_j) = a_i a_j C_ij + a_i S_i b_j + b_i a_j S_j + b_i b_j V
+    aS = scale * S
+    bV = offset * V
+    C2 = scale[..., :, None] * scale[..., None, :] * C
+    C2 += aS[..., :, None] * offset[..., None, :]
+    C2 += offset[..., :, None] * (aS + bV)[..., None, :]
+    C2 *= J[..., None, None]
+    return J * V, _inertia_from_moments(C2)
+
+
+def eclipse_timeline(dt_orbit, dt_eclipse, t):
+    """Illumination of circular orbits with one eclipse at the start of every
+    orbit, for use with `battery_soc` when no propagated trajectory is
+    available.
+
+    Parameters
+    ----------
+    dt_orbit, dt_eclipse : np.ndarray (n)
+        Orbit period and eclipse time [s]
+
+    t : np.ndarray (n_t)
+        Time since the start of an eclipse [s]
+
+    Returns
+    -------
+    illum : np.ndarray (n, n_t)
+        1 in sunlight and 0 in eclipse
+    """
+    dt_orbit = np.asarray(dt_orbit, dtype=float)[..., None]
+    dt_eclipse = np.asarray(dt_eclipse, dtype=float)[..., None]
+    return (np.mod(t, dt_orbit) >= dt_eclipse).astype(float)
+
+
+def battery_soc(
+    illum,
+    dt,
+    P_sa,
+    P_load,
+    eta_path=0.8,
+    eta_charge=np.sqrt(0.75),
+    eta_discharge=np.sqrt(0.75),
+    dod=None,
+    capacity=None,
+    history=False,
+):
+    """Battery energy balance over an illumination timeline.
+
+    Parameters
+    ----------
+    illum : np.ndarray (n, n_t) or (n_t)
+        Fraction of the sun visible from the satellite at each time step,
+        e.g. `solar.shadow_fraction` along a propagated trajectory or
+        `eclipse_timeline`
+
+    dt : float
+        Time step [s]
+
+    P_sa : np.ndarray (n)
+        Solar array output in full sunlight [W], e.g. from `array_power`
+        with the array area from `power`
+
+    P_load : np.ndarray (n) or (n, n_t)
+        Load power [W], e.g. P_tot from `power`
+
+    eta_path : float
+        Efficiency from the array to the loads in sunlight, 0.8 as in `power`
+
+    eta_charge, eta_discharge : float
+        Battery charge and discharge efficiency. The defaults give the 0.6
+        efficiency of the eclipse path in `power`, 0.8*0.866*0.866.
+
+    dod : float, optional
+        Maximum depth of discharge used to size the battery, e.g.
+        var_info["DOD"]
+
+    capacity : np.ndarray (n), optional
+        Battery capacity [W h]. Defaults to the capacity for which the deepest
+        discharge equals dod.
+
+    history : bool
+        Also return the state of charge at every time step
+
+    Returns
+    -------
+    q : np.ndarray (2, n)
+        q[0] = capacity, battery capacity [W h]
+        q[1] = soc_min, minimum state of charge. Negative values mean the
+               battery runs out of energy.
+
+    soc : np.ndarray (n, n_t)
+        State of charge after each time step, if history is True
+
+    Notes
+    -----
+    The battery starts full and stops charging when full. The energy
+    missing from a full battery follows the Lindley recursion
+    w_k = max(w_{k-1} - dE_k, 0), whose solution is
+    w_k = S_k - min(0, min_{j<=k} S_j) with S the cumulative sum of -dE.
+    This gives the whole timeline of all samples from one cumulative sum and
+    one running minimum.
+    """
+    illum = np.asarray(illum, dtype=float)
+    P_sa = np.asarray(P_sa, dtype=float)
+    P_load = np.asarray(P_load, dtype=float)
+    if P_load.ndim == P_sa.ndim:
+        P_load = P_load[..., None]
+    # power into the battery, negative when discharging [W]
+    P_net = eta_path * P_sa[..., None] * illum - P_load
+    dE = np.where(P_net > 0, eta_charge * P_net, P_net / eta_discharge)
+    S = np.cumsum(dE, axis=-1)
+    S *= -dt / 3600.0  # [W h]
+    # energy missing from a full battery
+    S -= np.minimum(np.minimum.accumulate(S, axis=-1), 0.0)
+    w_max = S.max(axis=-1)
+    q = np.empty((2,) + w_max.shape)
+    if capacity is None:
+        if dod is None:
+            raise ValueError("either dod or capacity is required")
+        q[0] = w_max / dod
+    else:
+        q[0] = capacity
+    np.divide(w_max, q[0], out=q[1])
+    np.subtract(1.0, q[1], out=q[1])
+    if history:
+        S /= -q[0][..., None]
+        S += 1.0
+        return q, S
+    return q
+
+
+def array_incidence(r_traj, v_traj, rsun, pointing="track", illum=None):
+    """Cosine loss of the solar array along propagated trajectories,
+    averaged over the time in sunlight.
+
+    Parameters
+    ----------
+    r_traj : np.ndarray (n, n_t, 3)
+        Position vectors in ECI coordinates [km], e.g. from
+        `orbit_model.propagate`
+
+    v_traj : np.ndarray (n, n_t, 3)
+        Velocity vectors in ECI coordinates [km/s]
+
+    rsun : np.ndarray (n_t, 3) or (n, n_t, 3)
+        Sun position vectors in ECI coordinates [km], from `solar.sun_pos`
+
+    pointing : str
+        Array pointing of a nadir pointing satellite
+        'sun' : the array tracks the sun on two axes, cos_i = 1
+        'track' : the array rotates about the orbit normal, so the incidence
+            angle is the beta angle
+        'zenith' : the array is fixed to the body facing away from the Earth
+
+    illum : np.ndarray (n, n_t), optional
+        Fraction of the sun visible at each time step, defaults to
+        `solar.shadow_fraction`
+
+    Returns
+    -------
+    q : np.ndarray (2, n)
+        q[0] = cos_i, cosine of the incidence angle averaged over the time in
+               sunlight, weighted by the visible fraction of the sun
+        q[1] = f_sun, fraction of the time in sunlight
+
+    Notes
+    -----
+    The sums over time are accumulated over blocks of time steps, so the work
+    arrays hold about `constants.BLOCK` points independent of the trajectory length.
+    """
+    if pointing not in ("sun", "track", "zenith"):
+        raise ValueError(f"unknown solar array pointing '{pointing}'")
+    n, n_t = r_traj.shape[:2]
+    lit = np.zeros(n)
+    lit_cos = np.zeros(n)
+    nb = max(min(n_t, BLOCK // max(n, 1)), 1)
+    for start in range(0, n_t, nb):
+        stop = min(start + nb, n_t)
+        r = r_traj[:, start:stop]
+        rs = rsun[..., start:stop, :]
+        if illum is None:
+            nu = solar.shadow_fraction(r, rs)
+        else:
+            nu = illum[:, start:stop]
+        lit += nu.sum(axis=-1)
+        if pointing == "sun":
+            continue
+        s = rs / np.linalg.norm(rs, axis=-1, keepdims=True)
+        if pointing == "track":
+            h = np.cross(r, v_traj[:, start:stop])
+            h /= np.linalg.norm(h, axis=-1, keepdims=True)
+            sb = np.sum(h * s, axis=-1)  # sine of the beta angle
+            cos_i = np.sqrt(np.maximum(1 - sb * sb, 0))
+        else:
+            cos_i = np.sum(r * s, axis=-1) / np.linalg.norm(r, axis=-1)
+            np.maximum(cos_i, 0, out=cos_i)
+        lit_cos += np.sum(nu * cos_i, axis=-1)
+    q = np.empty((2, n))
+    if pointing == "sun":
+        q[0] = np.where(lit > 0, 1.0, 0.0)
+    else:
+        np.divide(lit_cos, lit, out=q[0], where=lit > 0)
+        q[0][lit <= 0] = 0.0
+    np.divide(lit, n_t, out=q[1])
+    return q
@@ -2,8 +2,10 @@
 
 import numpy as np
 from numpy.linalg import norm
-from firesat.constants import DEG2RAD, AU_KM, R_EARTH
+from firesat.buffers import check_out
+from firesat.constants import DEG2RAD, AU_KM, R_EARTH, R_SUN
 import math
+from firesat import timefn, timescale
 
 
 def sun_sat_angle(rsat, rsun):
@@ -55,37 +57,84 @@ def is_sat_illuminated(rsat, rsun):
     return dist > R_EARTH
 
 
-def sun_pos(jdt):
+def shadow_fraction(rsat, rsun):
+    """Fraction of the solar disk visible from the satellite using a conical
+    umbra/penumbra shadow model of a spherical Earth
+    Args:
+        rsat : float (..., 3), satellite position vector in ECI [km]
+        rsun : float (..., 3), sun position vector in ECI [km], broadcast
+            against rsat
+    Output:
+        nu : float (...), illumination fraction, 0 in umbra, 1 in full sunlight
+    Notes:
+        The sun and Earth are treated as disks with apparent angular radii a and
+        b seen from the satellite, separated by the angle c. The occulted part
+        of the sun is the area of overlap of the two disks.
+    References:
+        Montenbruck and Gill, Satellite Orbits, 2000, p. 80, Sec. 3.4.2
+    """
+    rsat = np.asarray(rsat, dtype=float)
+    rsun = np.asarray(rsun, dtype=float)
+    d = rsun - rsat  # satellite to sun vector
+    rsat_mag = norm(rsat, axis=-1)
+    d_mag = norm(d, axis=-1)
+    a = np.arcsin(np.minimum(R_SUN / d_mag, 1.0))
+    b = np.arcsin(np.minimum(R_EARTH / rsat_mag, 1.0))
+    cosc = -np.sum(rsat * d, axis=-1) / (rsat_mag * d_mag)
+    c = np.arccos(np.clip(cosc, -1.0, 1.0))
+    # partial occultation, area of overlap of the two disks
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = (c * c + a * a - b * b) / (2 * c)
+        y = np.sqrt(np.maximum(a * a - x * x, 0.0))
+        area = (
+            a * a * np.arccos(np.clip(x / a, -1.0, 1.0))
+            + b * b * np.arccos(np.clip((c - x) / b, -1.0, 1.0))
+            - c * y
+        )
+    nu = 1 - area / (math.pi * a * a)
+    nu = np.where(c < a - b, 1 - (b * b) / (a * a), nu)  # annular eclipse
+    nu = np.where(c <= b - a, 0.0, nu)  # umbra
+    nu = np.where(c >= a + b, 1.0, nu)  # no occultation
+    return np.clip(nu, 0.0, 1.0)
+
+
+def sun_pos(jdt, out=None, scale=None):
     """Compute the Sun position vector from julian date
     Args:
-        jdt : float (n), array or scalar of julian dates
+        jdt : float (...) or timefn.JulianDate, array or scalar of julian
+            dates, any shape
+        out : float (..., 3), optional C-contiguous output array
+        scale : str, optional time scale of jdt, e.g. 'utc'. If given, jdt is
+            converted to TDB with `timescale.convert`, otherwise jdt is used
+            as both UT1 and TDB.
     Output:
-        r : float (n, 3), position vector of sun in ECI coordinates [km]
+        r : float (..., 3), position vector of sun in ECI coordinates [km],
+            C-contiguous with the shape of jdt plus a trailing axis
     References:
         Vallado, p. 279, Alg. 29
         Vallado software, AST2BODY.FOR, subroutine SUN
     """
-    jdt = np.atleast_1d(jdt)
-    t_ut1 = (jdt - 2451545.0)/36525
+    if scale is not None:
+        jdt = timescale.convert(jdt, scale, "tdb")
+    t_ut1 = timefn.days_since(jdt, 2451545.0)/36525
+    shape = t_ut1.shape + (3,)
+    out = check_out(out, shape)
     t_tdb = t_ut1
     lmda_Msun = (280.4606184 + 36000.77005361*t_tdb) % 360
     # M_sun = (357.5291092 + 35999.05034*t_tdb) % 360
     M_sun = (357.5277233 + 35999.05034*t_tdb) % 360
-    lmda_eclp = lmda_Msun + 1.914666471*np.sin(M_sun*DEG2RAD)
-    lmda_eclp += 0.019994643*np.sin(2*M_sun*DEG2RAD)
-    r_sun_mag = 1.000140612 - 0.016708617*np.cos(M_sun*DEG2RAD)
-    r_sun_mag -= 0.000139589*np.cos(2*M_sun*DEG2RAD)
-    eps = 23.439291 - 0.0130042*t_tdb
-    coslmda = np.cos(lmda_eclp*DEG2RAD)
-    sinlmda = np.sin(lmda_eclp*DEG2RAD)
-    coseps = np.cos(eps*DEG2RAD)
-    sineps = np.sin(eps*DEG2RAD)
-    if jdt.size > 1:
-        r = np.empty((3,jdt.size))
-    else:
-        r = np.empty(3)
-    r[0] = r_sun_mag * coslmda
-    r[1] = r_sun_mag * coseps * sinlmda
-    r[2] = r_sun_mag * sineps * sinlmda
-    r *= AU_KM
-    return r.T
+    M_sun *= DEG2RAD
+    lmda_eclp = lmda_Msun + 1.914666471*np.sin(M_sun)
+    lmda_eclp += 0.019994643*np.sin(2*M_sun)
+    lmda_eclp *= DEG2RAD
+    r_sun_mag = 1.000140612 - 0.016708617*np.cos(M_sun)
+    r_sun_mag -= 0.000139589*np.cos(2*M_sun)
+    r_sun_mag *= AU_KM
+    eps = (23.439291 - 0.0130042*t_tdb) * DEG2RAD
+    sinlmda = np.sin(lmda_eclp)
+    sinlmda *= r_sun_mag
+    # write each component straight into the trailing axis of out
+    np.multiply(r_sun_mag, np.cos(lmda_eclp), out=out[..., 0])
+    np.multiply(sinlmda, np.cos(eps), out=out[..., 1])
+    np.multiply(sinlmda, np.sin(eps), out=out[..., 2])
+    return out
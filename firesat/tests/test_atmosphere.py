@@ -4,6 +4,7 @@ import unittest
 import numpy as np
 import numpy.testing as npt
 import firesat.atmosphere as atmos
+from firesat.constants import AU_KM, R_EARTH
 
 class Test_Atmosphere(unittest.TestCase):
 
@@ -48,6 +49,83 @@ class Test_Atmosphere(unittest.TestCase):
         for i in range(len(h)):
             npt.assert_approx_equal(rho[i], rho_true[i])
 
+    def test_exponential_atmosphere_layers(self):
+        # compare against the layer equation at and around every layer boundary
+        W = atmos.WERTZ_1978_ATMOS
+        h = np.concatenate((W[:, 0], W[:, 0] + 4.9, [1000.0, 1250.0]))
+        idx = np.searchsorted(W[:, 0], h, side="right") - 1
+        rho_true = W[idx, 1] * np.exp(-(h - W[idx, 0]) / W[idx, 2])
+        npt.assert_allclose(atmos.exponential_density_model(h), rho_true, rtol=1e-12)
+
+    def test_exponential_atmosphere_bounds(self):
+        h = np.array([100.0, 400.0, 1500.0])
+        rho = atmos.exponential_density_model(h)
+        # below the table uses the lowest layer instead of wrapping around
+        npt.assert_approx_equal(rho[0], 2.070e-09 * np.exp(50 / 22.523))
+        rho = atmos.exponential_density_model(h, bounds="clip")
+        npt.assert_allclose(rho[[0, 2]], [2.070e-09, 3.019e-15])
+        rho = atmos.exponential_density_model(h, bounds="nan")
+        assert np.isnan(rho[0]) and np.isnan(rho[2]) and np.isfinite(rho[1])
+        with self.assertRaises(ValueError):
+            atmos.exponential_density_model(h, bounds="raise")
+        # a nan altitude gives a nan density without affecting the others
+        h = np.array([np.nan, 400.0])
+        for bounds in ("extrapolate", "clip", "nan"):
+            rho = atmos.exponential_density_model(h, bounds=bounds)
+            assert np.isnan(rho[0])
+            npt.assert_equal(rho[1], atmos.exponential_density_model(400.0))
+        with self.assertRaises(ValueError):
+            atmos.exponential_density_model(h, bounds="raise")
+
+    def test_exponential_atmosphere_out(self):
+        h = np.linspace(150, 1000, 40000).reshape(2, -1)
+        out = np.empty_like(h)
+        rho = atmos.exponential_density_model(h, out=out)
+        assert rho is out
+        npt.assert_allclose(out[1], atmos.exponential_density_model(h[1]))
+
+    def test_harris_priester_table(self):
+        # at the reference flux the nodes of the table are reproduced
+        HP = atmos.HARRIS_PRIESTER
+        r = (R_EARTH + HP[:, 0])[:, None] * np.array([1.0, 0, 0])
+        # sun placed so the apex of the bulge is on the x-axis
+        ra = -atmos.HP_LAG
+        rsun = AU_KM * np.array([np.cos(ra), np.sin(ra), 0])
+        npt.assert_allclose(atmos.harris_priester_density(r, rsun), HP[:, 2] * 1e-12, rtol=1e-10)
+        npt.assert_allclose(
+            atmos.harris_priester_density(-r, rsun), HP[:, 1] * 1e-12, rtol=1e-10
+        )
+        # halfway between two nodes the density is log-linear
+        rho = atmos.harris_priester_density(-r[[20]] - [10.0, 0, 0], rsun)
+        npt.assert_allclose(rho, np.sqrt(HP[20, 1] * HP[21, 1]) * 1e-12, rtol=1e-10)
+
+    def test_harris_priester_flux(self):
+        r = np.array([[R_EARTH + 110, 0, 0], [R_EARTH + 400, 0, 0], [R_EARTH + 800, 0, 0]])
+        rsun = np.array([0, AU_KM, 0])
+        rho = [atmos.harris_priester_density(r, rsun, F10_7=f) for f in (70, 150, 250)]
+        # the lower thermosphere is unchanged, higher flux raises the density above
+        npt.assert_allclose(rho[0][0], rho[2][0])
+        assert np.all(np.diff([x[1:] for x in rho], axis=0) > 0)
+        assert rho[2][2] / rho[0][2] > rho[2][1] / rho[0][1]
+        # tables are built once per flux level
+        self.assertIs(atmos.harris_priester_lut(70.0), atmos.harris_priester_lut(70.0))
+
+    def test_harris_priester_broadcast(self):
+        rsun = np.array([[AU_KM, 0, 0], [0, AU_KM, 0], [-AU_KM, 0, 0]])  # (n_t, 3)
+        t = np.linspace(0, 2 * np.pi, 3, endpoint=False)
+        r = (R_EARTH + np.array([300.0, 500.0]))[:, None, None] * np.stack(
+            [np.cos(t), np.sin(t), np.zeros(3)], axis=-1
+        )  # (n_sat, n_t, 3)
+        out = np.empty((2, 3))
+        rho = atmos.harris_priester_density(r, rsun, out=out)
+        assert rho is out
+        for i in range(2):
+            for j in range(3):
+                npt.assert_allclose(rho[i, j], atmos.harris_priester_density(r[i, j], rsun[j]))
+        assert np.all(rho[0] > rho[1])
+        with self.assertRaises(ValueError):
+            atmos.harris_priester_density(r, rsun, out=np.empty((3, 2)))
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,200 @@
+# Test attitude model
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+import firesat.atmosphere as atmos
+import firesat.complex_step as complex_step
+import firesat.system as system
+from firesat import attitude, geomag
+from firesat.attitude_model import (
+    attitude_constants,
+    attitude_partials,
+    disturbance_torques,
+    torque_history,
+    wheel_momentum,
+)
+from firesat.constants import AU_KM, BLOCK, OMEGA_EARTH
+
+class Test_Attitude(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def setUp(self):
+        self.var_info = system.setup()
+        H = np.array([400e3, 600e3, 800e3])
+        ones = np.ones(3)
+        # H, F_s, L_sp, q, L_a, C_d
+        self.x = np.vstack((H, 1400 * ones, 2 * ones, 0.5 * ones, 2 * ones, ones))
+        # v, dt_orbit, theta_slew
+        self.y = np.vstack((7600 * ones, 5600 * ones, 1e-5 * ones))
+
+    def test_attitude_density(self):
+        H = self.x[0]
+        rho = atmos.exponential_density_model(H / 1000)
+        q1 = attitude(self.x, self.y, self.var_info, fidelity=1)
+        q0 = attitude(self.x, self.y, self.var_info, fidelity=0, rho=rho)
+        npt.assert_allclose(q0, q1)
+        # dynamic pressure replaces rho and v
+        pdyn = 0.5 * rho * self.y[0] ** 2
+        q = attitude(self.x, self.y, self.var_info, fidelity=1, pdyn=pdyn)
+        npt.assert_allclose(q, q1)
+        q = attitude(self.x, self.y, self.var_info, fidelity=1, rho=10 * rho)
+        assert np.all(q[0] >= q1[0])
+
+    def test_attitude_lowfidelity(self):
+        # compare against the model equations, Wertz, SMAD, Sec. 11.1
+        vi = self.var_info
+        H, F_s, L_sp, q, L_a, C_d = self.x
+        v, dt_orbit, theta_slew = self.y
+        r3 = (vi["RE"] + H) ** 3
+        tau_slew = 4 * theta_slew / vi["dt_slew"] ** 2 * vi["I_max"]
+        tau_g = 1.5 * vi["mu"] / r3 * abs(vi["I_max"] - vi["I_min"]) * np.sin(2 * vi["theta"])
+        tau_sp = L_sp * F_s / vi["c"] * vi["A_s"] * (1 + q) * np.cos(vi["sun_i"])
+        tau_m = 2 * vi["M"] * vi["RD"] / r3
+        tau_a = 0.5 * L_a * vi["rho"] * C_d * vi["A"] * v ** 2
+        tau_tot = np.maximum(tau_slew, np.sqrt(tau_g ** 2 + tau_sp ** 2 + tau_m ** 2 + tau_a ** 2))
+        q = attitude(self.x, self.y, vi)
+        npt.assert_allclose(q[0], tau_tot, rtol=1e-12)
+        npt.assert_allclose(q[1], tau_tot * vi["omega_max"] + vi["n"] * vi["P_hold"], rtol=1e-12)
+
+    def test_attitude_out(self):
+        np.random.seed(1234)
+        n = 40000  # several blocks
+        x = self.x[:, np.random.randint(0, 3, n)] * (1 + 0.1 * np.random.rand(6, n))
+        y = self.y[:, np.random.randint(0, 3, n)]
+        q = np.empty((3, n))
+        consts = attitude_constants(self.var_info)
+        for fidelity in (0, 1):
+            res = attitude(x, y, self.var_info, fidelity, out=q[1:], constants=consts)
+            assert res.base is q
+            for i in (0, 20000, n - 1):
+                npt.assert_allclose(
+                    q[1:, i], attitude(x[:, [i]], y[:, [i]], self.var_info, fidelity)[:, 0]
+                )
+        with self.assertRaises(ValueError):
+            attitude(x, y, self.var_info, out=np.empty((n, 2)).T)
+
+    def test_disturbance_torques(self):
+        # circular equatorial orbits, the sun far along x
+        vi = self.var_info
+        # away from the layer boundaries of the density table
+        x = self.x.copy()
+        x[0] += 5e3
+        n_t = 20000  # several time blocks
+        rc = (vi["RE"] + x[0]) / 1000  # [km]
+        u = np.linspace(0, 2 * np.pi, n_t, endpoint=False)
+        e = np.stack((np.cos(u), np.sin(u), np.zeros(n_t)), axis=-1)
+        r = rc[:, None, None] * e
+        vc = np.sqrt(vi["mu"] / (rc * 1000)) / 1000  # [km/s]
+        v = vc[:, None, None] * np.stack((-np.sin(u), np.cos(u), np.zeros(n_t)), axis=-1)
+        rsun = np.array([AU_KM, 0, 0]) * np.ones((n_t, 1))
+        stats = disturbance_torques(r, v, rsun, x, vi)
+        self.assertEqual(stats.shape, (2, 5, 3))
+        const = attitude_constants(vi)
+        inv_r3 = (rc * 1000) ** -3
+        tau_g = abs(const.gravity * (vi["I_max"] - vi["I_min"])) * inv_r3
+        tau_m = 0.5 * const.magnetic * inv_r3
+        npt.assert_allclose(stats[:, 0], [tau_g, tau_g])
+        npt.assert_allclose(stats[:, 2], [tau_m, tau_m])
+        # drag at constant altitude and relative speed
+        H, F_s, L_sp, q, L_a, C_d = x
+        vrel = (vc - OMEGA_EARTH * rc) * 1000
+        rho = atmos.exponential_density_model(rc - vi["RE"] / 1000)
+        npt.assert_allclose(stats[0, 3], 0.5 * L_a * C_d * vi["A"] * rho * vrel ** 2)
+        # solar pressure switches off in the shadow, about a third of the orbit
+        tau_sp = const.solar * L_sp * F_s * (1 + q)
+        npt.assert_allclose(stats[0, 1], tau_sp, rtol=2e-4)  # sun distance
+        assert np.all((stats[1, 1] < 0.9 * tau_sp) & (stats[1, 1] > 0.7 * tau_sp))
+        assert np.all(stats[0, 4] >= stats[1, 4])
+        # a single sun vector is broadcast over all time blocks
+        self.assertGreater(n_t, BLOCK)
+        npt.assert_allclose(disturbance_torques(r, v, rsun[:1], x, vi), stats)
+        npt.assert_allclose(
+            torque_history(r, v, rsun[:1], x, vi), torque_history(r, v, rsun, x, vi)
+        )
+
+    def test_attitude_highfidelity(self):
+        vi = self.var_info
+        n_t = 50
+        u = np.linspace(0, 2 * np.pi, n_t)
+        rc = (vi["RE"] + self.x[0]) / 1000
+        e = np.stack((np.cos(u), np.zeros(n_t), np.sin(u)), axis=-1)
+        r = rc[:, None, None] * e
+        v = 7.5 * np.roll(e, 1, axis=-1)
+        rsun = np.array([0, AU_KM, 0])[None, :]
+        q = attitude(self.x, self.y, vi, fidelity=2, r_traj=r, v_traj=v, rsun=rsun)
+        stats = disturbance_torques(r, v, rsun, self.x, vi)
+        tau_slew = 4 * self.y[2] / vi["dt_slew"] ** 2 * vi["I_max"]
+        npt.assert_allclose(q[0], np.maximum(tau_slew, stats[0, 4]))
+        # the polar orbit passes through the strongest magnetic field
+        npt.assert_allclose(stats[0, 2], attitude_constants(vi).magnetic * (rc * 1000) ** -3, rtol=1e-3)
+        # tilted dipole field on a time grid
+        jd = 2451545.0 + np.linspace(0, 0.1, n_t)
+        stats = disturbance_torques(r, v, rsun, self.x, vi, jd=jd)
+        tau_m = geomag.dipole_torque(r, np.full(3, vi["RD"]), jd)
+        npt.assert_allclose(stats[0, 2], tau_m.max(axis=1))
+        npt.assert_allclose(stats[1, 2], np.sqrt(np.mean(tau_m ** 2, axis=1)))
+
+    def test_torque_history(self):
+        vi = self.var_info
+        n_t = 30
+        u = np.linspace(0, 2 * np.pi, n_t)
+        r = 7000.0 * np.stack((np.cos(u), np.sin(u), np.zeros(n_t)), axis=-1)[None] * np.ones((3, 1, 1))
+        v = 7.5 * np.stack((-np.sin(u), np.cos(u), np.zeros(n_t)), axis=-1)[None] * np.ones((3, 1, 1))
+        rsun = np.array([[AU_KM, 0, 0]])
+        tau = torque_history(r, v, rsun, self.x, vi)
+        self.assertEqual(tau.shape, (5, 3, n_t))
+        stats = disturbance_torques(r, v, rsun, self.x, vi)
+        npt.assert_allclose(stats[0], tau.max(axis=-1))
+        npt.assert_allclose(stats[1], np.sqrt(np.mean(tau ** 2, axis=-1)))
+
+    def test_wheel_momentum(self):
+        # constant torque dumps at regular intervals
+        tau = np.full((1, 100), 0.25)
+        q, h = wheel_momentum(tau, 1.0, 0.5, omega_max=2.0, history=True)
+        npt.assert_allclose(q[:, 0], [25.0, 50, 50 * 0.5, 0.5])
+        npt.assert_allclose(h[0, :3], [0.25, 0.0, 0.25])
+        # compare against a loop over samples and time steps, over several
+        # blocks of the timeline with many dumps per block
+        np.random.seed(1234)
+        n, n_t, dt = 20, 2500, 6.0
+        tau = 1e-3 * (np.random.rand(n, n_t) - 0.3)
+        h_max = np.linspace(0.005, 0.5, n)
+        q, h = wheel_momentum(tau, dt, h_max, dt_orbit=np.full(n, 600.0), history=True)
+        for i in range(n):
+            hi, n_dump, dumped, peak = 0.0, 0, 0.0, 0.0
+            h_ref = np.empty(n_t)
+            for j in range(n_t):
+                hi += tau[i, j] * dt
+                peak = max(peak, abs(hi))
+                if abs(hi) >= h_max[i]:
+                    n_dump += 1
+                    dumped += abs(hi)
+                    hi = 0.0
+                h_ref[j] = hi
+            npt.assert_allclose(h[i], h_ref, atol=1e-12)
+            npt.assert_allclose(q[1:, i], [n_dump, 0.5 * dumped, peak])
+            npt.assert_allclose(q[0, i], abs(tau[i].sum()) * dt / (n_t * dt) * 600.0)
+
+    def test_attitude_partials(self):
+        vi = self.var_info
+        ones = np.ones(3)
+        # disturbance torque, then slewing torque dominates
+        for theta_slew in (1e-5, 1.0):
+            y = np.vstack((self.y[:2], theta_slew * ones, 6600 * ones, 5100 * ones))
+            dq_dx, dq_dy = attitude_partials(self.x, y, vi)
+            J_x = complex_step.jacobian(lambda z: attitude(z, y, vi), self.x)
+            J_y = complex_step.jacobian(lambda z: attitude(self.x, z, vi), y)
+            npt.assert_allclose(dq_dx, J_x, rtol=1e-12, atol=1e-300)
+            npt.assert_allclose(dq_dy, J_y, rtol=1e-12, atol=1e-300)
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Attitude)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+import firesat.beta as beta
+import firesat.solar as solar
+import firesat.system as system
+import firesat.timefn as timefn
+import firesat.utils as utils
+from firesat import orbit
+from firesat.constants import DEG2RAD, RAD2DEG
+
+
+class Test_Beta(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def test_beta_angle_equatorial(self):
+        # equatorial orbit, beta is the declination of the sun
+        jdt = timefn.julian_date(2006, 6, 21, 12)  # June solstice
+        rsun = solar.sun_pos(jdt)
+        b = beta.beta_angle(0.0, 0.0, rsun) * RAD2DEG
+        npt.assert_almost_equal(b, 23.44, decimal=1)
+
+    def test_beta_angle_broadcast(self):
+        rsun = solar.sun_pos(2451545.0 + np.arange(5.0))  # (n_t, 3)
+        raan = np.linspace(0, np.pi, 4)[:, None]  # (n, 1)
+        b = beta.beta_angle(raan, 98 * DEG2RAD, rsun)
+        self.assertEqual(b.shape, (4, 5))
+        assert np.all(np.abs(b) <= np.pi / 2)
+
+    def test_eclipse_fraction(self):
+        sat_params = system.setup()
+        RE = sat_params["RE"]
+        H = np.array([5e5, 1.8e7])
+        npt.assert_allclose(
+            beta.eclipse_fraction(0.0, H, RE), np.arcsin(RE / (RE + H)) / np.pi
+        )
+        # no eclipse once the orbit plane clears the shadow
+        beta_star = np.arcsin(RE / (RE + H))
+        npt.assert_equal(beta.eclipse_fraction(beta_star + 1e-3, H, RE), 0.0)
+        f = beta.eclipse_fraction(np.linspace(0, 1.2, 20)[:, None], H, RE)
+        assert np.all(np.diff(f, axis=0) <= 0)
+
+    def test_orbit_beta(self):
+        np.random.seed(1234)
+        sat_params = system.setup()
+        x = utils.mvn(["H", "phi"], 100)
+        q0 = orbit(x, sat_params)
+        npt.assert_allclose(orbit(x, sat_params, beta=0.0), q0)
+        q1 = orbit(x, sat_params, beta=0.2)
+        assert np.all(q1[2] < q0[2])
+        npt.assert_array_equal(q1[[0, 1, 3]], q0[[0, 1, 3]])
+        # the propagated orbits do not take a beta angle
+        with self.assertRaises(ValueError):
+            orbit(x, sat_params, fidelity=1, beta=0.2)
+
+    def test_seasonal_eclipse(self):
+        sat_params = system.setup()
+        H = np.array([7e5, 1.8e7])
+        jd0 = timefn.julian_date(2020, 1, 1)
+        dt_ecl = beta.seasonal_eclipse(H, sat_params, jd0, incl=98 * DEG2RAD)
+        self.assertEqual(dt_ecl.shape, (3, 2))
+        assert np.all((dt_ecl[1] <= dt_ecl[0]) & (dt_ecl[0] <= dt_ecl[2]))
+        # upper bound is the beta = 0 eclipse time
+        q = orbit(H, sat_params)
+        assert np.all(dt_ecl[2] <= q[2] * (1 + 1e-12))
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Beta)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,59 @@
+# Test complex step helpers
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+import firesat.complex_step as cs
+import firesat.system as system
+import firesat.utils as utils
+
+
+class Test_ComplexStep(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def test_jacobian(self):
+        x = np.array([[0.5, 1.0, 2.0], [3.0, -1.0, 0.25]])
+        J = cs.jacobian(lambda z: np.stack((np.sin(z[0]) * z[1], np.exp(z[1]))), x)
+        npt.assert_allclose(J[0, 0], np.cos(x[0]) * x[1], rtol=1e-15)
+        npt.assert_allclose(J[0, 1], np.sin(x[0]), rtol=1e-15)
+        npt.assert_equal(J[1, 0], 0.0)
+        npt.assert_allclose(J[1, 1], np.exp(x[1]), rtol=1e-15)
+
+    def test_branches(self):
+        a = np.array([1.0, -2.0, 3.0])
+        b = np.array([2.0, -3.0, 1.0])
+        da = 1j * cs.H_STEP
+        npt.assert_equal(cs.maximum(a, b), np.maximum(a, b))
+        npt.assert_equal(cs.minimum(a, b), np.minimum(a, b))
+        npt.assert_equal(cs.absolute(b), np.abs(b))
+        # the derivative follows the selected argument
+        npt.assert_equal(cs.maximum(a + da, b).imag / cs.H_STEP, [0, 1, 1])
+        npt.assert_equal(cs.minimum(a + da, b).imag / cs.H_STEP, [1, 0, 0])
+        npt.assert_equal(cs.absolute(b + da).imag / cs.H_STEP, [1, -1, 1])
+        out = np.empty(3, dtype=complex)
+        r = cs.maximum(a + da, b, out=out)
+        assert r is out
+        npt.assert_equal(out.real, np.maximum(a, b))
+
+    def test_feedback_methods(self):
+        # every feedback method carries complex steps to the solution
+        np.random.seed(42)
+        sat_params = system.setup()
+        sat_params['dt_slew'] = 1
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], 20)
+        dq = system.total_derivatives(x, sat_params)
+        for method in ('gauss-seidel', 'aitken', 'anderson', 'newton'):
+            kwargs = dict(var_info=sat_params, feedforward=False, method=method, tol=1e-15, maxiter=200)
+            J = cs.jacobian(lambda z: system.run(z, **kwargs), x)
+            npt.assert_allclose(J, dq, rtol=1e-8, atol=1e-12 * np.abs(dq).max())
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_ComplexStep)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as npt
+import firesat.solar as solar
+from firesat.ephemeris import SunEphemeris
+from firesat.constants import J2000
+
+
+class Test_Ephemeris(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def setUp(self):
+        # one year span starting at J2000
+        self.eph = SunEphemeris.build(J2000, J2000 + 365.25, seg_days=8.0, deg=10)
+
+    def test_error_bound(self):
+        np.random.seed(42)
+        jdt = J2000 + np.random.rand(10000) * 365.25
+        diff = self.eph(jdt) - solar.sun_pos(jdt)
+        err = np.linalg.norm(diff, axis=1)
+        # sub-kilometer agreement, and the stored bound is representative
+        assert self.eph.err < 1.0
+        assert err.max() < 2 * self.eph.err
+
+    def test_shape(self):
+        jdt = J2000 + np.linspace(0, 365, 12).reshape(3, 4)
+        r = self.eph(jdt)
+        self.assertEqual(r.shape, (3, 4, 3))
+        npt.assert_allclose(r[1, 2], solar.sun_pos(jdt[1, 2]), rtol=1e-10)
+        self.assertEqual(self.eph(J2000).shape, (3,))
+        # end points are inside the span
+        self.eph(self.eph.jd1)
+        with self.assertRaises(ValueError):
+            self.eph(J2000 - 1.0)
+        # less than a segment past the end
+        with self.assertRaises(ValueError):
+            self.eph(self.eph.jd1 + 0.5 * self.eph.seg_days)
+        with self.assertRaises(ValueError):
+            self.eph(np.array([J2000, self.eph.jd1 + 1e-6]))
+        with self.assertRaises(ValueError):
+            SunEphemeris.build(J2000, J2000 + 10, deg=0)
+
+    def test_save_load(self):
+        jdt = J2000 + np.linspace(0, 365, 50)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, "sun.npy")
+            self.eph.save(fname)
+            eph = SunEphemeris.load(fname)
+            self.assertIsInstance(eph.coef, np.memmap)
+            self.assertEqual(eph.jd0, self.eph.jd0)
+            self.assertEqual(eph.err, self.eph.err)
+            npt.assert_array_equal(eph(jdt), self.eph(jdt))
+            del eph
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Ephemeris)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
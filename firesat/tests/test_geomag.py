@@ -0,0 +1,67 @@
+# Test tilted dipole geomagnetic field
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from firesat import geomag, timescale
+
+class Test_Geomag(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def test_axial_dipole(self):
+        g = geomag.dipole_vector(g10=-30000.0, g11=0.0, h11=0.0)
+        r = geomag.R_REF * np.array([[1.0, 0, 0], [0, 0, 1.0], [0, 0, -2.0]])
+        B = geomag.dipole_field(r, g=g)
+        # horizontal and northward at the equator, vertical at the poles
+        npt.assert_allclose(B[0], [0, 0, 30000e-9])
+        npt.assert_allclose(B[1], [0, 0, -60000e-9])
+        npt.assert_allclose(B[2], [0, 0, -60000e-9 / 8])
+        npt.assert_allclose(geomag.field_magnitude(r, g=g), np.linalg.norm(B, axis=-1))
+
+    def test_tilted_dipole(self):
+        g = geomag.dipole_vector()
+        # strongest field along the dipole axis
+        u = np.stack((g, np.cross(g, [0, 0, 1.0])))
+        r = 7000.0 * u / np.linalg.norm(u, axis=-1, keepdims=True)
+        B = geomag.field_magnitude(r)
+        k = np.linalg.norm(g) * (geomag.R_REF / 7000.0) ** 3
+        npt.assert_allclose(B, [2 * k, k])
+        # the geomagnetic north pole is near 80.7 N, 72.7 W for 2020
+        lat = np.arcsin(-g[2] / np.linalg.norm(g)) * 180 / np.pi
+        lon = np.arctan2(-g[1], -g[0]) * 180 / np.pi
+        npt.assert_allclose([lat, lon], [80.65, -72.68], atol=0.1)
+
+    def test_ecef_rotation(self):
+        jd = 2451545.0 + np.linspace(0, 1, 7)
+        R = geomag.ecef_rotation(jd)
+        self.assertEqual(R.shape, (7, 3, 3))
+        npt.assert_allclose(R @ np.swapaxes(R, -1, -2), np.broadcast_to(np.eye(3), R.shape), atol=1e-15)
+        theta = timescale.gmst(jd, "utc")
+        npt.assert_allclose(R[:, 0, 0], np.cos(theta))
+        # cached per time grid
+        self.assertIs(geomag.ecef_rotation(jd.copy()), R)
+        assert not R.flags.writeable
+
+    def test_field_eci(self):
+        # the field at a position fixed in ECEF does not change with time
+        jd = 2451545.0 + np.linspace(0, 1, 5)
+        r_ecef = np.array([4000.0, 3000.0, 5000.0])
+        R = geomag.ecef_rotation(jd)
+        r_eci = np.einsum("tji,j->ti", R, r_ecef)
+        B = geomag.dipole_field(r_eci[None], jd)  # (n_sat, n_t, 3)
+        self.assertEqual(B.shape, (1, 5, 3))
+        B_ecef = np.einsum("tij,stj->sti", R, B)
+        npt.assert_allclose(B_ecef[0], np.broadcast_to(geomag.dipole_field(r_ecef), (5, 3)), rtol=1e-12)
+        tau = geomag.dipole_torque(r_eci[None], [5.0], jd)
+        npt.assert_allclose(tau, 5.0 * np.linalg.norm(B, axis=-1))
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Geomag)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -2,6 +2,9 @@ import unittest
 import numpy as np
 import numpy.testing as npt
 from firesat import orbit
+from firesat.orbit_model import propagate, orbit_drag, orbit_partials
+import firesat.atmosphere as atmos
+import firesat.complex_step as complex_step
 import firesat.solar as solar
 import firesat.timefn as timefn
 import firesat.utils as utils
@@ -35,11 +38,49 @@ class Test_Orbit(unittest.TestCase):
         qoi = orbit(x, sat_params, fidelity=1)
         qoi_means = np.mean(qoi, axis=1)
         qoi_means_true = np.array([
-            3999.73915, 39189.6937, 6291.00484, 1.23764331e-5
+            3999.73915, 39189.6937, 3110.95340, 1.23764331e-5
         ])
         for i, q in enumerate(qoi_means):
             npt.assert_approx_equal(q, qoi_means_true[i])
 
+    def test_propagate(self):
+        sat_params = system.setup()
+        H = np.array([500e3, 800e3])
+        t = np.linspace(0, 120, 25)
+        r, v, epoch = propagate(H, sat_params, t)
+        self.assertEqual(r.shape, (2, 25, 3))
+        self.assertEqual(v.shape, (2, 25, 3))
+        # near circular orbits
+        h = np.linalg.norm(r, axis=-1) * 1000 - sat_params["RE"]
+        npt.assert_allclose(h.mean(axis=1), H, rtol=0.05)
+
+    def test_orbit_drag(self):
+        np.random.seed(1234)
+        h = 400e3 + 50e3 * np.random.rand(3, 50)
+        v = 7600 + 10 * np.random.rand(3, 50)
+        q = orbit_drag(h, v)
+        rho = atmos.exponential_density_model(h / 1000)
+        pdyn = 0.5 * rho * v ** 2
+        npt.assert_allclose(q[0], rho.mean(axis=1))
+        npt.assert_allclose(q[1], rho.max(axis=1))
+        npt.assert_allclose(q[2], pdyn.mean(axis=1))
+        npt.assert_allclose(q[3], pdyn.max(axis=1))
+        # profiles of different lengths packed back to back
+        offsets = [0, 20, 70]
+        q = orbit_drag(h.ravel()[:100], v.ravel()[:100], offsets=offsets)
+        npt.assert_allclose(q[1], [rho.ravel()[s:e].max() for s, e in [(0, 20), (20, 70), (70, 100)]])
+        npt.assert_allclose(q[0, 2], rho.ravel()[70:100].mean())
+        # user supplied densities
+        q = orbit_drag(h, v, rho=2 * rho)
+        npt.assert_allclose(q[0], 2 * rho.mean(axis=1))
+
+    def test_orbit_partials(self):
+        var_info = system.setup()
+        x = np.array([[400e3, 800e3, 18e6], [235.0, 150.0, 300.0]])
+        dq = orbit_partials(x, var_info)
+        J = complex_step.jacobian(lambda z: orbit(z, var_info), x)
+        npt.assert_allclose(dq, J, rtol=1e-12, atol=1e-300)
+
 np.random.seed(1234)
 sat_params = system.setup()
 n = 10
@@ -48,6 +89,7 @@ x = utils.mvn(['H', 'phi'], n)
 def prof_orbit():
     orbit(x, sat_params)
 
+
 if __name__ == "__main__":
 
     import cProfile
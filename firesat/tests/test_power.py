@@ -0,0 +1,295 @@
+# Test power model
+
+import unittest
+import itertools
+import numpy as np
+import numpy.testing as npt
+import firesat.complex_step as complex_step
+import firesat.system as system
+import firesat.solar as solar
+from firesat.constants import AU_KM
+from firesat import power
+from firesat.power_model import (
+    mesh_inertia,
+    mesh_moments,
+    affine_inertia,
+    inertia_low_fidelity,
+    inertia_medium_fidelity,
+    inertia_high_fidelity,
+    battery_soc,
+    eclipse_timeline,
+    array_incidence,
+    power_constants,
+    power_partials,
+    array_power,
+)
+
+try:
+    import tetgen
+except ImportError:
+    tetgen = None
+
+def box_mesh(lo, hi):
+    """Six tetrahedra sharing the main diagonal of a box"""
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    corner = np.array(list(itertools.product([0, 1], repeat=3)))[:, ::-1]
+    nodes = lo + corner * (hi - lo)
+    elems = []
+    for perm in itertools.permutations(range(3)):
+        idx = [0]
+        for k in perm:
+            idx.append(idx[-1] + 2 ** k)
+        elems.append(idx)
+    return nodes, np.array(elems)
+
+
+class Test_Power(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def test_mesh_inertia_box(self):
+        lo, hi = np.array([1.0, -2.0, 0.5]), np.array([3.0, 1.0, 0.75])
+        nodes, elems = box_mesh(lo, hi)
+        m, I = mesh_inertia(nodes, elems, 700.0)
+        size = hi - lo
+        c = 0.5 * (lo + hi)
+        m_true = 700.0 * np.prod(size)
+        npt.assert_allclose(m, m_true)
+        # parallel axis theorem from the centroidal inertia
+        I_true = np.diag(m_true / 12 * (np.sum(size ** 2) - size ** 2))
+        I_true += m_true * (np.dot(c, c) * np.eye(3) - np.outer(c, c))
+        npt.assert_allclose(I, I_true)
+
+    def test_mesh_inertia_panel(self):
+        # the low fidelity solar array formulas are exact for a flat plate
+        W, L, D, t = np.array([1.2]), np.array([3.5]), 2.0, 0.005
+        nodes, elems = box_mesh([-W[0] / 2, D, -t / 2], [W[0] / 2, D + L[0], t / 2])
+        m, I = mesh_inertia(nodes, elems, 700.0)
+        I_sax, I_say, I_saz, m_sa = inertia_low_fidelity(W, L, D, t, 700.0, 1)
+        npt.assert_allclose(m, m_sa[0])
+        npt.assert_allclose(np.diag(I), [I_sax[0], I_say[0], I_saz[0]])
+        npt.assert_allclose(I[[0, 0, 1], [1, 2, 2]], 0, atol=1e-12)
+
+    def test_mesh_inertia_batch(self):
+        nodes, elems = box_mesh([0, 0, 0], [1, 2, 3])
+        batch = np.stack((nodes, 2 * nodes, nodes + 1))
+        m, I = mesh_inertia(batch, elems, 1.0)
+        self.assertEqual(I.shape, (3, 3, 3))
+        for k in range(3):
+            mk, Ik = mesh_inertia(batch[k], elems, 1.0)
+            npt.assert_allclose(m[k], mk)
+            npt.assert_allclose(I[k], Ik)
+        # mass scales with volume and inertia with volume times length^2
+        npt.assert_allclose(I[1], 32 * I[0])
+
+    def test_affine_inertia(self):
+        nodes, elems = box_mesh([-0.5, 0, -0.5], [0.5, 1, 0.5])
+        moments = mesh_moments(nodes, elems)
+        np.random.seed(1234)
+        scale = 0.5 + np.random.rand(4, 3)
+        offset = np.random.randn(4, 3)
+        m, I = affine_inertia(moments, scale, offset, 700.0)
+        self.assertEqual(I.shape, (4, 3, 3))
+        for k in range(4):
+            mk, Ik = mesh_inertia(nodes * scale[k] + offset[k], elems, 700.0)
+            npt.assert_allclose(m[k], mk)
+            npt.assert_allclose(I[k], Ik)
+
+    @unittest.skipIf(tetgen is None, "requires tetgen")
+    def test_inertia_high_fidelity(self):
+        # the box formulas of the low fidelity model are exact
+        W = np.array([0.8, 1.2, 2.0])
+        L = np.array([2.4, 3.6, 6.0])
+        hifi = inertia_high_fidelity(W, L, 2, 0.005, 700, 1)
+        lofi = inertia_low_fidelity(W, L, 2, 0.005, 700, 1)
+        npt.assert_allclose(hifi, lofi)
+        # several panels sum the same placements as the medium fidelity
+        for layout in ("star", "wings", "inline"):
+            for n_sa in (2, 3, 4):
+                hifi = inertia_high_fidelity(W, L, 2, 0.005, 700, n_sa, layout)
+                I, _, m = inertia_medium_fidelity(W, L, 2, 0.005, 700, n_sa, layout)
+                npt.assert_allclose(hifi[:3], np.transpose(np.diagonal(I, axis1=1, axis2=2)))
+                npt.assert_allclose(hifi[3], m)
+
+    def test_inertia_medium_fidelity(self):
+        W, L, D, t = np.array([0.8, 1.2]), np.array([2.4, 3.6]), 2.0, 0.005
+        lofi = inertia_low_fidelity(W, L, D, t, 700.0, 1)
+        for layout in ("star", "wings", "inline"):
+            I, I_p, m = inertia_medium_fidelity(W, L, D, t, 700.0, 1, layout)
+            npt.assert_allclose(np.diagonal(I, axis1=1, axis2=2), np.transpose(lofi[:3]))
+            npt.assert_allclose(m, lofi[3])
+        with self.assertRaises(ValueError):
+            inertia_medium_fidelity(W, L, D, t, 700.0, 1, "ring")
+
+    def test_inertia_medium_fidelity_layouts(self):
+        # compare against meshes of the rotated and translated panels
+        W, L, D, t = 1.2, 3.6, 2.0, 0.005
+        nodes, elems = box_mesh([-W / 2, 0, -t / 2], [W / 2, L, t / 2])
+        layouts = {
+            "star": [(0, 0), (2 * np.pi / 3, 0), (4 * np.pi / 3, 0)],
+            "wings": [(0, 0), (np.pi, 0), (0, 1)],
+            "inline": [(0, 0), (0, 1), (0, 2)],
+        }
+        for layout, panels in layouts.items():
+            I_true = np.zeros((3, 3))
+            for angle, pos in panels:
+                c, s = np.cos(angle), np.sin(angle)
+                R = np.array([[c, -s, 0], [s, c, 0], [0, 0, 1.0]])
+                pts = (nodes + [0, D + pos * L, 0]) @ R.T
+                I_true += mesh_inertia(pts, elems, 700.0)[1]
+            I, I_p, m = inertia_medium_fidelity(np.array([W]), np.array([L]), D, t, 700.0, 3, layout)
+            npt.assert_allclose(I[0], I_true, atol=1e-9)
+            npt.assert_allclose(I_p[0], np.linalg.eigvalsh(I_true))
+            npt.assert_allclose(m, 3 * 700.0 * W * L * t)
+
+    def test_power_fidelity(self):
+        var_info = system.setup()
+        x = np.array([[1000.0, 1100.0], [1400.0, 1400.0]])
+        y = np.array([[100.0, 120.0], [30000.0, 31000.0], [3000.0, 3100.0]])
+        q0 = power(x, y, var_info, fidelity=0)
+        q1 = power(x, y, var_info, fidelity=1)
+        npt.assert_allclose(q1[:2], q0[:2])
+        W = np.sqrt(q0[1] / (var_info["r_lw"] * var_info["n_sa"]))
+        L = W * var_info["r_lw"]
+        I, I_p, m = inertia_medium_fidelity(W, L, var_info["D"], var_info["t"], var_info["rho_sa"], var_info["n_sa"])
+        I += np.diag([var_info["I_bodyx"], var_info["I_bodyy"], var_info["I_bodyz"]])
+        I_p = np.linalg.eigvalsh(I)
+        npt.assert_allclose(q1[2:], [I_p[:, 2], I_p[:, 0]])
+        # three panels add more inertia than the single panel of fidelity 0
+        assert np.all(q1[2] > q0[2])
+
+    def test_battery_soc_balance(self):
+        # an array sized by the power model recharges the battery every orbit
+        var_info = system.setup()
+        dt_orbit = np.array([5600.0, 6000.0])
+        dt_eclipse = np.array([2100.0, 1800.0])
+        x = np.array([[1000.0, 1100.0], [1400.0, 1400.0]])
+        y = np.vstack(([100.0, 120.0], dt_orbit, dt_eclipse))
+        P_tot, A_sa = power(x, y, var_info)[:2]
+        P_sa = array_power(A_sa, x[1], var_info)
+        T_d = dt_orbit - dt_eclipse
+        npt.assert_allclose(P_sa, (P_tot * dt_eclipse / 0.6 + P_tot * T_d / 0.8) / T_d)
+        t = np.arange(0, 3 * 6000.0, 10.0)
+        illum = eclipse_timeline(dt_orbit, dt_eclipse, t)
+        q, soc = battery_soc(illum, 10.0, P_sa, P_tot, dod=var_info["DOD"], history=True)
+        npt.assert_allclose(q[1], 1 - var_info["DOD"])
+        E_e = P_tot * dt_eclipse / 3600 / np.sqrt(0.75)  # [W h]
+        npt.assert_allclose(q[0], E_e / var_info["DOD"])
+        npt.assert_allclose(soc[[0, 1], [559, 599]], 1.0)
+        # a larger battery is discharged less deeply
+        q = battery_soc(illum, 10.0, P_sa, P_tot, capacity=2 * q[0])
+        npt.assert_allclose(q[1], 1 - var_info["DOD"] / 2)
+
+    def test_battery_soc_loop(self):
+        np.random.seed(1234)
+        n, n_t, dt = 5, 400, 30.0
+        illum = np.clip(2 * np.random.rand(n, n_t) - 0.5, 0, 1)
+        P_sa = 200 + 50 * np.random.rand(n)
+        P_load = 80 + 40 * np.random.rand(n, n_t)
+        q, soc = battery_soc(illum, dt, P_sa, P_load, capacity=np.full(n, 50.0), history=True)
+        for i in range(n):
+            E, E_min = 50.0, 50.0
+            for k in range(n_t):
+                P = 0.8 * P_sa[i] * illum[i, k] - P_load[i, k]
+                E += dt / 3600 * (np.sqrt(0.75) * P if P > 0 else P / np.sqrt(0.75))
+                E = min(E, 50.0)
+                E_min = min(E_min, E)
+                npt.assert_allclose(soc[i, k], E / 50.0)
+            npt.assert_allclose(q[1, i], E_min / 50.0)
+        with self.assertRaises(ValueError):
+            battery_soc(illum, dt, P_sa, P_load)
+
+    def test_array_incidence(self):
+        # circular equatorial orbits, several time blocks
+        n_t = 20000
+        u = np.linspace(0, 2 * np.pi, n_t, endpoint=False)
+        e = np.stack((np.cos(u), np.sin(u), np.zeros(n_t)), axis=-1)
+        r = np.array([6800.0, 7200.0])[:, None, None] * e
+        v = 7.5 * np.stack((-np.sin(u), np.cos(u), np.zeros(n_t)), axis=-1) * np.ones((2, 1, 1))
+        # sun in the orbit plane
+        rsun = np.tile([AU_KM, 0, 0], (n_t, 1))
+        nu = solar.shadow_fraction(r, rsun)
+        q = array_incidence(r, v, rsun, "track")
+        npt.assert_allclose(q[0], 1.0)
+        npt.assert_allclose(q[1], nu.mean(axis=1))
+        assert np.all((q[1] > 0.6) & (q[1] < 0.7))
+        q = array_incidence(r, v, rsun, "zenith")
+        cos_i = np.maximum(np.cos(u), 0)
+        npt.assert_allclose(q[0], (nu * cos_i).sum(axis=1) / nu.sum(axis=1))
+        npt.assert_allclose(array_incidence(r, v, rsun, "sun")[0], 1.0)
+        # sun along the orbit normal, always lit edge on to a tracking array
+        q = array_incidence(r, v, np.tile([0, 0, AU_KM], (n_t, 1)), "track")
+        npt.assert_allclose(q, [[0, 0], [1, 1]], atol=1e-7)
+        with self.assertRaises(ValueError):
+            array_incidence(r, v, rsun, "fixed")
+
+    def test_power_incidence(self):
+        var_info = system.setup()
+        x = np.array([[1000.0, 1100.0], [1400.0, 1400.0]])
+        y = np.array([[100.0, 120.0], [30000.0, 31000.0], [3000.0, 3100.0]])
+        q0 = power(x, y, var_info)
+        q = power(x, y, var_info, cos_i=np.array([0.5, 0.8]))
+        npt.assert_allclose(q[1], q0[1] / [0.5, 0.8])
+        # inclined orbit, the tracking array loses the beta angle
+        n_t = 100
+        u = np.linspace(0, 2 * np.pi, n_t)
+        e = np.stack((np.cos(u), np.sin(u) * np.cos(0.5), np.sin(u) * np.sin(0.5)), axis=-1)
+        r = 7000.0 * e * np.ones((2, 1, 1))
+        v = 7.5 * np.gradient(e, axis=0) * np.ones((2, 1, 1))
+        rsun = np.tile([0, AU_KM, 0], (n_t, 1))
+        q = power(x, y, var_info, r_traj=r, v_traj=v, rsun=rsun)
+        npt.assert_allclose(q[1], q0[1] / np.cos(0.5))
+
+    def test_power_out(self):
+        var_info = system.setup()
+        n = 11
+        x = np.vstack((np.linspace(900.0, 1100.0, n), np.full(n, 1400.0)))
+        y = np.vstack((np.linspace(50.0, 150.0, n), np.full(n, 5800.0), np.linspace(1500.0, 2200.0, n)))
+        x0, y0 = x.copy(), y.copy()
+        q = power(x, y, var_info)
+        # reference from the per panel inertia of the low fidelity model
+        T_d = y[1] - y[2]
+        P_tot = y[0] + x[0]
+        P_sa = (P_tot * y[2] / 0.6 + P_tot * T_d / 0.8) / T_d
+        PEOL = var_info["nu"] * x[1] * var_info["I_d"] * np.cos(var_info["sun_i"]) * (1 - var_info["eps_deg"]) ** var_info["LT"]
+        A_sa = P_sa / PEOL
+        L = np.sqrt(A_sa * var_info["r_lw"] / var_info["n_sa"])
+        W = np.sqrt(A_sa / (var_info["r_lw"] * var_info["n_sa"]))
+        I = np.array(inertia_low_fidelity(W, L, var_info["D"], var_info["t"], var_info["rho_sa"], var_info["n_sa"])[:3])
+        I += np.array([var_info["I_bodyx"], var_info["I_bodyy"], var_info["I_bodyz"]])[:, None]
+        npt.assert_allclose(q, [P_tot, A_sa, I.max(axis=0), I.min(axis=0)])
+        # preallocated output, constants and a work space smaller than n
+        out = np.empty((4, n))
+        work = np.empty((3, 4))
+        constants = power_constants(var_info)
+        for fidelity in (0, 1):
+            r = power(x, y, var_info, fidelity, out=out, constants=constants, work=work)
+            assert r is out
+            npt.assert_allclose(out, power(x, y, var_info, fidelity))
+        npt.assert_equal(x, x0)
+        npt.assert_equal(y, y0)
+        with self.assertRaises(ValueError):
+            power(x, y, var_info, out=np.empty((n, 4)).T)
+        with self.assertRaises(ValueError):
+            power(x, y, var_info, work=np.empty((2, 4)))
+
+    def test_power_partials(self):
+        var_info = system.setup()
+        x = np.array([[900.0, 1000.0, 1100.0], [1380.0, 1400.0, 1420.0]])
+        y = np.array([[60.0, 150.0, 400.0], [5600.0, 5800.0, 42000.0], [2100.0, 1900.0, 3300.0]])
+        dq_dx, dq_dy = power_partials(x, y, var_info)
+        J_x = complex_step.jacobian(lambda z: power(z, y, var_info), x)
+        J_y = complex_step.jacobian(lambda z: power(x, z, var_info), y)
+        npt.assert_allclose(dq_dx, J_x, rtol=1e-12, atol=1e-300)
+        npt.assert_allclose(dq_dy, J_y, rtol=1e-12, atol=1e-300)
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Power)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -8,7 +8,7 @@ import numpy.testing as npt
 import firesat.solar as solar
 import firesat.timefn as timefn
 import datetime
-from firesat.constants import AU_KM, DEG2RAD, RAD2DEG
+from firesat.constants import AU_KM, DEG2RAD, RAD2DEG, R_EARTH, R_SUN
 
 class Test_Solar(unittest.TestCase):
 
@@ -22,7 +22,7 @@ class Test_Solar(unittest.TestCase):
         jdt = 2453827.5  # April 2, 2006, 00:00 UTC
         jdt = np.asarray(jdt)
         r = solar.sun_pos(jdt)
-        r_true = np.array([146186212, 28788976, 12481064], dtype=np.float)
+        r_true = np.array([146186212, 28788976, 12481064], dtype=float)
         npt.assert_allclose(r, r_true, rtol=1e-4)
 
     def test_sun_pos2(self):
@@ -49,6 +49,34 @@ class Test_Solar(unittest.TestCase):
         npt.assert_allclose(r[0], r_true0, rtol=1e-3)
         npt.assert_allclose(r[1], r_true1, rtol=1e-4)
 
+    def test_sun_pos_shape(self):
+        jdt = 2450540.54722222 + np.arange(12.0).reshape(3, 4)
+        r = solar.sun_pos(jdt)
+        self.assertEqual(r.shape, (3, 4, 3))
+        assert r.flags.c_contiguous
+        npt.assert_allclose(r.reshape(-1, 3), solar.sun_pos(jdt.ravel()))
+        npt.assert_allclose(r[1, 2], solar.sun_pos(jdt[1, 2]))
+        self.assertEqual(solar.sun_pos(2453827.5).shape, (3,))
+
+    def test_sun_pos_split(self):
+        jd = timefn.jdt_tsince(timefn.jd_split(2453827.5), np.linspace(0, 1440, 5))
+        r = solar.sun_pos(jd)
+        npt.assert_allclose(r, solar.sun_pos(timefn.jd_join(jd)), rtol=1e-10)
+        npt.assert_allclose(
+            solar.sun_pos(jd, scale="utc"),
+            solar.sun_pos(timefn.jd_join(jd), scale="utc"),
+            rtol=1e-10,
+        )
+
+    def test_sun_pos_out(self):
+        jdt = np.array([2450540.54722222, 2453827.5])
+        out = np.empty((2, 3))
+        r = solar.sun_pos(jdt, out=out)
+        assert r is out
+        npt.assert_allclose(out[1] / AU_KM, [0.97719447, 0.19244242, 0.08343076], rtol=1e-4)
+        with self.assertRaises(ValueError):
+            solar.sun_pos(jdt, out=np.empty((3, 2)).T)
+
     def test_sun_sat_angle(self):
         """
         Vallado, Eg. 11-6, p.913
@@ -104,6 +132,32 @@ class Test_Solar(unittest.TestCase):
         for i in range(len(vis)):
             assert vis[i]
 
+    def test_shadow_fraction(self):
+        rsun = np.array([AU_KM, 0, 0])
+        npt.assert_equal(solar.shadow_fraction([7000, 0, 0], rsun), 1.0)
+        npt.assert_equal(solar.shadow_fraction([-7000, 0, 0], rsun), 0.0)
+        # annular eclipse beyond the apex of the umbra cone
+        rsat = np.array([-3.0e6, 0, 0])
+        a = np.arcsin(R_SUN / (AU_KM + 3.0e6))
+        b = np.arcsin(R_EARTH / 3.0e6)
+        npt.assert_almost_equal(solar.shadow_fraction(rsat, rsun), 1 - b**2 / a**2)
+
+    def test_shadow_fraction_penumbra(self):
+        # cross the shadow boundary behind the Earth
+        rsun = np.array([AU_KM, 0, 0])
+        y = np.linspace(6300, 6450, 7)
+        rsat = np.stack([np.full(7, -7000.0), y, np.zeros(7)], axis=-1)
+        nu = solar.shadow_fraction(rsat, rsun)
+        assert np.all(np.diff(nu) >= 0)
+        assert np.all((nu[2:5] > 0) & (nu[2:5] < 1))
+        npt.assert_equal(nu[[0, -1]], [0.0, 1.0])
+
+    def test_shadow_fraction_broadcast(self):
+        rsun = solar.sun_pos(np.linspace(2451545.0, 2451546.0, 5))  # (n_t, 3)
+        rsat = np.zeros((4, 5, 3)) + [7000.0, 0, 0]  # (n_sat, n_t, 3)
+        nu = solar.shadow_fraction(rsat, rsun)
+        self.assertEqual(nu.shape, (4, 5))
+
 
 if __name__ == "__main__":
 
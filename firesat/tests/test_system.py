@@ -1,7 +1,9 @@
 import unittest
 import numpy as np
+import firesat
 import firesat.system as system
 import firesat.utils as utils
+import firesat.complex_step as complex_step
 from firesat import power
 
 class Test_Firesat(unittest.TestCase):
@@ -34,6 +36,89 @@ class Test_Firesat(unittest.TestCase):
         qoi = power(x, y, var_info=sat_params, fidelity=fidelity)
         self.assertTrue(True)
 
+    def test_firesat_feedback(self):
+        # Test feedback coupled system, inputs in the order of system.run
+        n = 1000
+        sat_params = system.setup()
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], n)
+        x[:, 0] = [12000000, 200, 1000, 1400, 2, 0.5, 2, 1]
+        q, info = system.run(x, var_info=sat_params, feedforward=False, full_output=True)
+        self.assertTrue(info['converged'].all())
+        self.assertTrue(np.all((info['n_iter'] >= 2) & (info['n_iter'] <= 5)))
+        # the inertia fed back reproduces itself
+        q_atd, q_pow, _ = system.solve_feedback(x, sat_params)
+        q_orb = firesat.orbit(x[[0, 1]], sat_params)
+        y_atd = np.vstack((q_orb[[0, 1, 3]], q_pow[2:]))
+        q_atd1 = firesat.attitude(x[[0, 3, 4, 5, 6, 7]], y_atd, sat_params)
+        y_pow = np.vstack((q_atd1[1], q_orb[[1, 2]]))
+        q_pow1 = power(x[[2, 3]], y_pow, sat_params)
+        np.testing.assert_allclose(q_pow1, q_pow, rtol=1e-9)
+        np.testing.assert_allclose(q, [q_pow[0], q_pow[1], q_atd[0]])
+        # samples stop when they converge, the rest run to maxiter
+        q_atd, q_pow, info = system.solve_feedback(x, sat_params, maxiter=1)
+        self.assertFalse(info['converged'].any())
+        np.testing.assert_equal(info['n_iter'], 1)
+
+    def test_firesat_feedback_accelerated(self):
+        # strong coupling from a short slew time, slow for plain iteration
+        n = 1000
+        sat_params = system.setup()
+        sat_params['dt_slew'] = 1
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], n)
+        q_atd, q_pow, info = system.solve_feedback(x, sat_params)
+        self.assertTrue(info['converged'].all())
+        for method, depth in [('aitken', 1), ('anderson', 1), ('anderson', 3)]:
+            q_atd1, q_pow1, info1 = system.solve_feedback(x, sat_params, method=method, depth=depth)
+            self.assertTrue(info1['converged'].all())
+            self.assertLess(info1['n_iter'].mean(), 0.7 * info['n_iter'].mean())
+            np.testing.assert_allclose(q_pow1, q_pow, rtol=1e-8)
+            np.testing.assert_allclose(q_atd1, q_atd, rtol=1e-8)
+        q = system.run(x, var_info=sat_params, feedforward=False, method='anderson')
+        np.testing.assert_allclose(q, [q_pow[0], q_pow[1], q_atd[0]], rtol=1e-8)
+        with self.assertRaises(ValueError):
+            system.solve_feedback(x, sat_params, method='broyden')
+
+    def test_firesat_feedback_newton(self):
+        n = 1000
+        sat_params = system.setup()
+        sat_params['dt_slew'] = 1
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], n)
+        q_atd, q_pow, info = system.solve_feedback(x, sat_params)
+        q_atd1, q_pow1, info1 = system.solve_feedback(x, sat_params, method='newton')
+        self.assertTrue(info1['converged'].all())
+        self.assertLessEqual(info1['n_iter'].max(), 5)
+        np.testing.assert_allclose(q_pow1, q_pow, rtol=1e-8)
+        np.testing.assert_allclose(q_atd1, q_atd, rtol=1e-8)
+        # total derivatives reuse the partials of the last Newton iteration
+        dq = system.total_derivatives(x, sat_params, q_pow=q_pow1, partials=info1['partials'])
+        np.testing.assert_allclose(dq, system.total_derivatives(x, sat_params, q_pow=q_pow1), rtol=1e-6)
+        self.assertEqual(dq.shape, (3, 8, n))
+
+    def test_total_derivatives(self):
+        sat_params = system.setup()
+        sat_params['dt_slew'] = 1
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], 20)
+        dq = system.total_derivatives(x, sat_params)
+        kwargs = dict(var_info=sat_params, feedforward=False, method='newton', tol=1e-15)
+        J = complex_step.jacobian(lambda z: system.run(z, **kwargs), x)
+        np.testing.assert_allclose(dq, J, rtol=1e-8, atol=1e-12 * np.abs(J).max())
+
+    def test_firesat_gradient(self):
+        # total derivatives against complex step derivatives of run
+        x = utils.mvn(['H', 'phi', 'Po', 'F_s', 'L_sp', 'q', 'L_a', 'C_d'], 50)
+        for dt_slew in (760, 1):
+            sat_params = system.setup()
+            sat_params['dt_slew'] = dt_slew
+            q0, dq = system.run(x, var_info=sat_params, gradient=True)
+            np.testing.assert_allclose(q0, system.run(x, var_info=sat_params))
+            J = complex_step.jacobian(lambda z: system.run(z, var_info=sat_params), x)
+            np.testing.assert_allclose(dq, J, rtol=1e-12, atol=1e-300)
+            kwargs = dict(var_info=sat_params, feedforward=False, method='newton')
+            q1, dq, info = system.run(x, gradient=True, full_output=True, **kwargs)
+            self.assertTrue(info['converged'].all())
+            J = complex_step.jacobian(lambda z: system.run(z, tol=1e-15, **kwargs), x)
+            np.testing.assert_allclose(dq, J, rtol=1e-8, atol=1e-12 * np.abs(J).max())
+
 
 if __name__ == "__main__":
 
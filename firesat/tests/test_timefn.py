@@ -53,14 +53,33 @@ class Test_Timefn(unittest.TestCase):
         jdt = timefn.julian_date(dt)
         npt.assert_almost_equal(jdt, 2453827.5, decimal=12)
 
-    # def test_julian_date_vectorized(self):
-    #     """Use an array of datetimes to find the Julian Date"""
-    #     dt_ary = np.arange(
-    #         "2019-09-14T00:00:00", "2019-10-07T00:00:00", 200, dtype="datetime64"
-    #     )
-    #     jd_vectorized = np.vectorize(timefn.julian_date)
-    #     jd_ary = jd_vectorized(dt_ary)
-    #     # print(jd_ary)
+    def test_julian_date_vectorized(self):
+        """Use an array of datetimes to find the Julian Date"""
+        dt_ary = np.arange(
+            "2019-09-14T00:00:00", "2019-10-07T00:00:00", 200, dtype="datetime64"
+        )
+        jd_ary = timefn.julian_date(dt_ary)
+        jd_true = [timefn.julian_date(dt) for dt in dt_ary.astype(datetime.datetime)]
+        npt.assert_allclose(jd_ary, jd_true, rtol=0, atol=1e-9)
+
+    def test_julian_date_datetime64_scalar(self):
+        dt = np.datetime64("2004-04-06T07:51:27.946039", "ns")
+        jd = timefn.julian_date(dt)
+        npt.assert_almost_equal(jd, 2453101.8274067827, decimal=9)
+
+    def test_jd_to_datetime64(self):
+        dt_ary = np.arange(
+            "2019-09-14T00:00:00", "2019-10-07T00:00:00", 200, dtype="datetime64[s]"
+        ).reshape(-1, 2)
+        dt = timefn.jd_to_datetime64(timefn.julian_date(dt_ary))
+        self.assertEqual(dt.dtype, np.dtype("datetime64[ns]"))
+        self.assertEqual(dt.shape, dt_ary.shape)
+        # float64 julian dates resolve about 40 microseconds
+        err = (dt - dt_ary).astype(np.int64)
+        assert np.all(np.abs(err) < 50000)
+        self.assertEqual(
+            timefn.jd_to_datetime64(2453827.5), np.datetime64("2006-04-02", "ns")
+        )
 
     def test_jd_from_skyfield(self):
         """From skyfield.tests.test_earth_satellites.py"""
@@ -164,6 +183,30 @@ class Test_Timefn(unittest.TestCase):
             npt.assert_almost_equal(sec[i], t_true[i][5], decimal=6)
         #     print(f'{tsince[i]:6.1f}  {jd[i]:15.8f}  {year[i]:4.0f}  {mon[i]:2.0f}  {day[i]:2.0f}  {hr[i]:2.0f}:{minute[i]:2.0f}:{sec[i]:10.6f}')
 
+    def test_invjday_calendar(self):
+        # every 7 hours 13 minutes across leap and common years
+        dt0 = datetime.datetime(1999, 12, 30, 0, 0, 30)
+        step = datetime.timedelta(hours=7, minutes=13)
+        dts = [dt0 + k * step for k in range(6000)]
+        jd = np.array([timefn.julian_date(dt) for dt in dts])
+        year, mon, day, hr, minute, sec = timefn.invjday(jd)
+        npt.assert_array_equal(year, [dt.year for dt in dts])
+        npt.assert_array_equal(mon, [dt.month for dt in dts])
+        npt.assert_array_equal(day, [dt.day for dt in dts])
+        npt.assert_array_equal(hr, [dt.hour for dt in dts])
+        npt.assert_array_equal(minute, [dt.minute for dt in dts])
+        npt.assert_allclose(sec, 30.0, atol=1e-4)
+
+    def test_days2mdhms(self):
+        mon, day, hr, minute, sec = timefn.days2mdhms(2000, 60.5)
+        self.assertEqual((mon, day, hr, minute), (2, 29, 12, 0))
+        year = np.array([2001, 2001, 2004, 2004])
+        days = np.array([31.0, 32.0, 366.25, 1.0])
+        mon, day, hr, minute, sec = timefn.days2mdhms(year, days)
+        npt.assert_array_equal(mon, [1, 2, 12, 1])
+        npt.assert_array_equal(day, [31, 1, 31, 1])
+        npt.assert_array_equal(hr, [0, 0, 6, 0])
+
     def test_jdt_tsince(self):
         jdt_start = timefn.julian_date(2000, 6, 28, 0, 50, 19.733571)
         tsince = np.linspace(0, 3960, 12)
@@ -187,11 +230,39 @@ class Test_Timefn(unittest.TestCase):
         for i in range(len(jd)):
             npt.assert_almost_equal(jd[i], jd_true[i], decimal=8)
 
+    def test_jd_split(self):
+        jd = timefn.jd_split(2451545.0, np.array([-0.25, 0.5, 1.75]))
+        npt.assert_array_equal(jd.day, [2451544.0, 2451545.0, 2451546.0])
+        npt.assert_array_equal(jd.frac, [0.75, 0.5, 0.75])
+        npt.assert_array_equal(timefn.jd_join(jd), [2451544.75, 2451545.5, 2451546.75])
+        jd = timefn.julian_date(2004, 4, 6, 7, 51, 28.386 - 0.439961, split=True)
+        self.assertEqual(jd.day, 2453101.0)
+        npt.assert_almost_equal(jd.frac, 0.8274067827, decimal=9)
 
-if __name__ == "__main__":
+    def test_jdt_tsince_split(self):
+        # millisecond steps 15 years after the start epoch
+        tstart = timefn.julian_date(2000, 6, 28, split=True)
+        tsince = 15 * 525960.0 + np.arange(5) * 1e-3 / 60.0
+        jd = timefn.jdt_tsince(tstart, tsince)
+        self.assertIsInstance(jd, timefn.JulianDate)
+        dt = np.diff(jd.frac) * 86400.0
+        npt.assert_allclose(dt, 1e-3, rtol=1e-4)
+        # a single float64 julian date resolves about 40 microseconds
+        jd1 = timefn.jdt_tsince(timefn.jd_join(tstart), tsince)
+        self.assertGreater(np.abs(np.diff(jd1) * 86400.0 - 1e-3).max(), 1e-5)
+
+    def test_datetime64_split(self):
+        dt = np.datetime64("2019-09-14T06:00:00.000000123")
+        jd = timefn.julian_date(dt, split=True)
+        self.assertEqual(jd.day, 2458740.0)
+        self.assertEqual(timefn.jd_to_datetime64(jd), dt)
+        # fraction stored as float32 keeps millisecond resolution
+        jd32 = timefn.JulianDate(jd.day, np.float32(jd.frac))
+        err = (timefn.jd_to_datetime64(jd32) - dt).astype(np.int64)
+        assert abs(err) < 10 ** 6
 
-    # T = Test_Timefn()
-    # T.test_julian_date_vectorized()
+
+if __name__ == "__main__":
 
     test_cases = [Test_Timefn]
     suite = unittest.TestSuite()
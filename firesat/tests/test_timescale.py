@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+import numpy.testing as npt
+import firesat.sgp4 as sgp4
+import firesat.solar as solar
+import firesat.timefn as timefn
+import firesat.timescale as ts
+from firesat.constants import DAY_S
+
+
+class Test_Timescale(unittest.TestCase):
+
+    def shortDescription(self):
+        return None
+
+    def test_tai_minus_utc(self):
+        jd = np.array([
+            timefn.julian_date(1970, 6, 1),
+            timefn.julian_date(1999, 1, 1),
+            timefn.julian_date(2016, 12, 31, 23, 59, 59.5),
+            timefn.julian_date(2017, 1, 1),
+            timefn.julian_date(2030, 1, 1),
+        ])
+        npt.assert_array_equal(ts.tai_minus_utc(jd), [10, 32, 36, 37, 37])
+        assert ts.leap_second_table() is ts.leap_second_table()
+
+    def test_convert(self):
+        jd = timefn.julian_date(2004, 4, 6, 7, 51, 28.386009)
+        dt = lambda to: (ts.convert(jd, "utc", to) - jd) * DAY_S
+        npt.assert_almost_equal(dt("tai"), 32.0, decimal=4)
+        npt.assert_almost_equal(dt("tt"), 64.184, decimal=4)
+        # Vallado, Eg. 3-7, UT1 - UTC = -0.4399619 s
+        npt.assert_almost_equal(dt("ut1"), -0.44, decimal=1)
+        assert abs(dt("tdb") - dt("tt")) < 0.002
+
+    def test_convert_roundtrip(self):
+        jd = timefn.julian_date(1990, 1, 1) + np.linspace(0, 30 * 365.25, 1001)
+        for scale in ts.SCALES:
+            back = ts.convert(ts.convert(jd, "utc", scale), scale, "utc")
+            npt.assert_allclose(back, jd, rtol=0, atol=1e-4 / DAY_S)
+        with self.assertRaises(ValueError):
+            ts.convert(jd, "utc", "gps")
+
+    def test_gmst(self):
+        jd = 2451545.0 + np.linspace(-5000, 5000, 7).reshape(7, 1)
+        theta = ts.gmst(jd)
+        self.assertEqual(theta.shape, (7, 1))
+        for i in range(7):
+            npt.assert_almost_equal(theta[i, 0], sgp4.gstime(jd[i, 0]), decimal=10)
+
+    def test_sun_pos_scale(self):
+        jdt = timefn.julian_date(2006, 4, 2) + np.arange(3.0)
+        r = solar.sun_pos(jdt, scale="utc")
+        # about a minute of sun motion along its orbit
+        err = np.linalg.norm(r - solar.sun_pos(jdt), axis=1)
+        assert np.all((err > 1e3) & (err < 3e3))
+
+
+if __name__ == "__main__":
+
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    tests = loader.loadTestsFromTestCase(Test_Timescale)
+    suite.addTests(tests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -1,8 +1,56 @@
 import datetime
+from collections import namedtuple
 import numpy as np
 from numpy import datetime64
 
 
+# Two-part julian date, a whole number of days plus a fraction of a day in
+# [0, 1). A float64 julian date near the present resolves about 40 us, the
+# fraction alone resolves nanoseconds, and it keeps millisecond resolution
+# even when stored as float32.
+JulianDate = namedtuple("JulianDate", ["day", "frac"])
+
+
+def jd_split(jd, frac=0.0):
+    """Return the two-part julian date for jd + frac
+
+    Args:
+        jd : float (...) or JulianDate, julian date
+        frac : float (...), additional days added to the fractional part
+    Output:
+        JulianDate : day is the whole number of days, frac is in [0, 1)
+    """
+    if isinstance(jd, JulianDate):
+        jd, frac = jd.day, jd.frac + frac
+    # move whole days of both parts into day before adding the fractions
+    day = np.floor(jd) + np.floor(frac)
+    frac = (jd - np.floor(jd)) + (frac - np.floor(frac))
+    carry = np.floor(frac)
+    return JulianDate(day + carry, frac - carry)
+
+
+def jd_join(jd):
+    """Return a julian date as a single float, jd may be a JulianDate"""
+    if isinstance(jd, JulianDate):
+        return jd.day + jd.frac
+    return jd
+
+
+def days_since(jd, epoch):
+    """Days elapsed from epoch to jd. For a JulianDate the whole days are
+    differenced first, so no precision is lost to the size of jd.
+
+    Args:
+        jd : float (...) or JulianDate, julian date
+        epoch : float, julian date of the epoch
+    Output:
+        days : float (...)
+    """
+    if isinstance(jd, JulianDate):
+        return np.asarray((jd.day - epoch) + jd.frac, dtype=float)
+    return np.asarray(jd, dtype=float) - epoch
+
+
 def julian_day(year, month=1, day=1):
     """Given a proleptic Gregorian calendar date, return a Julian day int."""
     janfeb = month < 3
@@ -15,94 +63,133 @@ def julian_day(year, month=1, day=1):
     )
 
 
-def julian_date(yr, mo=1, dy=1, hr=0, mn=0, sec=0.0):
-    """Given a proleptic Gregorian calendar date, return a Julian date float."""
-    if isinstance(yr, datetime.datetime) or isinstance(yr, datetime64):
-        if isinstance(yr, datetime64):
-            dt = yr.astype(datetime.datetime)
-        else:
-            dt = yr
+# julian date of the numpy datetime64 epoch, 1970-01-01T00:00:00
+JD_UNIX_EPOCH = 2440587.5
+NS_PER_DAY = 86400 * 10 ** 9
+
+
+def julian_date(yr, mo=1, dy=1, hr=0, mn=0, sec=0.0, split=False):
+    """Given a proleptic Gregorian calendar date, return a Julian date float.
+    yr may also be a datetime.datetime, or a numpy datetime64 scalar or array,
+    which is converted without iterating over its elements. With split=True
+    a two-part JulianDate is returned."""
+    if isinstance(yr, (np.ndarray, datetime64)) and yr.dtype.kind == "M":
+        return datetime64_to_jd(yr, split=split)
+    if isinstance(yr, datetime.datetime):
+        dt = yr
         yr, mo, dy = dt.year, dt.month, dt.day
         hr, mn, sec = dt.hour, dt.minute, dt.second
         sec += dt.microsecond * (10 ** -6)
-    return julian_day(yr, mo, dy) - 0.5 + (sec + mn * 60.0 + hr * 3600.0) / 86400.0
+    frac = (sec + mn * 60.0 + hr * 3600.0) / 86400.0
+    if split:
+        return jd_split(julian_day(yr, mo, dy) - 0.5, frac)
+    return julian_day(yr, mo, dy) - 0.5 + frac
+
+
+def datetime64_to_jd(dt, split=False):
+    """Convert numpy datetime64 values to Julian dates
+
+    Args:
+        dt : datetime64 (...), array or scalar of any datetime64 unit, e.g.
+            np.asarray(pandas.DatetimeIndex)
+        split : bool, return a two-part JulianDate
+    Output:
+        jd : float (...) or JulianDate, julian dates
+    Notes:
+        The whole days and the remaining nanoseconds since the datetime64
+        epoch are split with integer arithmetic before converting to float,
+        so the result is limited only by the float64 julian date.
+    """
+    ns = np.asarray(dt, dtype="datetime64[ns]").view(np.int64)
+    days, rem = np.divmod(ns, NS_PER_DAY)
+    if split:
+        return jd_split(JD_UNIX_EPOCH + days, rem / NS_PER_DAY)
+    return (JD_UNIX_EPOCH + days) + rem / NS_PER_DAY
+
 
+def jd_to_datetime64(jd):
+    """Convert Julian dates to numpy datetime64[ns] values
 
-def jdt_tsince(tstart, tsince):
+    Args:
+        jd : float (...) or JulianDate, array or scalar of julian dates
+    Output:
+        dt : datetime64[ns] (...), rounded to the nearest nanosecond. A float64
+            julian date near the present only resolves about 40 microseconds,
+            use a JulianDate for full resolution.
+    """
+    jd = jd_split(jd)
+    jd = jd_split(jd.day - JD_UNIX_EPOCH, jd.frac)  # days since the epoch
+    ns = np.asarray(jd.day).astype(np.int64) * NS_PER_DAY
+    ns += np.rint(np.asarray(jd.frac) * NS_PER_DAY).astype(np.int64)
+    return ns.view("datetime64[ns]")
+
+
+def jdt_tsince(tstart, tsince, split=False):
     """Return a vector of julian dates from tstart with points at tsince
 
     Args:
-        tstart : float, julian date
+        tstart : float or JulianDate, julian date
         tsince: float (n), vector of minutes past tstart to calculate the julian date
+        split : bool, return a two-part JulianDate, implied if tstart is one
     Output:
-        jdt : float (n), vector of julian date ouputs. Can be inputted into solar functions
+        jdt : float (n) or JulianDate, vector of julian date ouputs. Can be
+            inputted into solar functions
     References:
         Rhodes, python-sgp4/sgp4/ext.py
         Vallado, 'Revisiting Spacetrack Report #3'
     """
+    if split or isinstance(tstart, JulianDate):
+        return jd_split(tstart, (tsince * 60.0) / 86400.0)
     return tstart + (tsince * 60.0) / 86400.0
 
 
+# cumulative number of days at the end of months 1..11, common and leap years
+_MONTH_END = np.cumsum(
+    [
+        (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30),
+        (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30),
+    ],
+    axis=1,
+)
+# cumulative number of days before the start of months 1..12
+_MONTH_START = np.hstack((np.zeros((2, 1), dtype=int), _MONTH_END))
+
+
 def days2mdhms(year, days):
     """This procedure converts the day of the year, days, to the equivalent month, day, hour, minute and second.
 
     Args:
-        year : int, year between 1900 - 2100
-        days : float, julian day of the year between 0.0 - 366.0
+        year : int (n), year between 1900 - 2100
+        days : float (n), julian day of the year between 0.0 - 366.0
     Outputs:
-        mon : int, month, 1 .. 12
-        day : int, day, 1 .. 28,29,30,31
-        hr : int, hour, 0 .. 23
-        min : int, minute 0 .. 59
-        sec : float, second, 0.0 .. 59.999
+        mon : int (n), month, 1 .. 12
+        day : int (n), day, 1 .. 28,29,30,31
+        hr : int (n), hour, 0 .. 23
+        min : int (n), minute 0 .. 59
+        sec : float (n), second, 0.0 .. 59.999
     References:
         Vallado
         Rhodes, python-sgp4/sgp4/ext.py
     """
-    # # int array containing the number of days per month
-    # lmonth = [(31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
-    #           (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)]
-    # dayofyr = np.floor_divide(days, 1.0).astype(int)  # day of year
-    # # dayofyr = int(days // 1.0)  # day of year
-    # # find month and day of month
-    # lpyr_idx = (year % 4) == 0
-    # i = 1
-    # inttemp = 0
-    # while dayofyr > inttemp + lmonth[i - 1] and i < 12:
-    #     inttemp = inttemp + lmonth[i - 1]
-    #     i += 1
-    # mon = i
-    # day = dayofyr - inttemp
-    # # find hours minutes and seconds
-    # temp = (days - dayofyr) * 24.0
-    # hr = np.floor_divide(temp, 1.0).astype(int)
-    # # hr = int(temp // 1.0)
-    # temp = (temp - hr) * 60.0
-    # minute = np.floor_divide(temp, 1.0).astype(int)
-    # # minute = int(temp // 1.0)
-    # sec = (temp - minute) * 60.0
-    # return mon, day, hr, minute, sec
-
-    # non vectorized version...
-    lmonth = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
-    dayofyr = int(days // 1.0)  # day of year
-    # find month and day of month
-    if (year % 4) == 0:
-        # int array containing the number of days per month
-        lmonth = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
-    i = 1
-    inttemp = 0
-    while dayofyr > inttemp + lmonth[i - 1] and i < 12:
-        inttemp = inttemp + lmonth[i - 1]
-        i += 1
-    mon = i
-    day = dayofyr - inttemp
+    year, days = np.broadcast_arrays(year, days)
+    dayofyr = np.floor(days).astype(int)  # day of year
+    # find month and day of month from the cumulative month tables
+    lpyr = ((year % 4) == 0).astype(int)
+    mon = np.where(
+        lpyr,
+        np.searchsorted(_MONTH_END[1], dayofyr, side="left"),
+        np.searchsorted(_MONTH_END[0], dayofyr, side="left"),
+    )
+    day = dayofyr - _MONTH_START[lpyr, mon]
+    mon += 1
     # find hours minutes and seconds
     temp = (days - dayofyr) * 24.0
-    hr = int(temp // 1.0)
+    hr = np.floor(temp).astype(int)
     temp = (temp - hr) * 60.0
-    minute = int(temp // 1.0)
+    minute = np.floor(temp).astype(int)
     sec = (temp - minute) * 60.0
+    if year.ndim == 0:
+        return mon[()], day[()], hr[()], minute[()], sec[()]
     return mon, day, hr, minute, sec
 
 
@@ -111,29 +198,22 @@ def invjday(jd):
     julian date. jd can be ut1, tdt, tdb, etc.
 
     Args:
-        jd : float, julian date, days from 4713 BCE
+        jd : float (n) or JulianDate, julian date, days from 4713 BCE
     Outputs:
-        year : int, year between 1900 - 2100
-        mon : int, month between 1 - 12
-        day : int, day between 1 - 31
-        hr : int, hour between 0 - 23
-        min : int, minute between 0 - 59
-        sec : float, second between 0.0 - 59.999
+        year : int (n), year between 1900 - 2100
+        mon : int (n), month between 1 - 12
+        day : int (n), day between 1 - 31
+        hr : int (n), hour between 0 - 23
+        min : int (n), minute between 0 - 59
+        sec : float (n), second between 0.0 - 59.999
     References:
         Vallado, 2007, 208, alg 22, ex 3-13
         Rhodes, python-sgp4/sgp4/ext.py
     """
     # find year and days of the year
-    jd = np.atleast_1d(jd)
-    temp = jd - 2415019.5
+    temp = np.atleast_1d(days_since(jd, 2415019.5))
     tu = temp / 365.25  # julian centuries from 0 h jan 0, 1900
     year = 1900 + np.floor_divide(tu, 1.0).astype(int)
-    # if type(year) == np.int64:
-    #     # not hasattr(year, '__getitem__'):
-    #     print('hello')
-    #     year = np.asarray(year)
-    #     print(type(year))
-    # leapyrs = int(((year - 1901) * 0.25) // 1.0)  # number of leap years from 1900
     leapyrs = np.floor_divide(((year - 1901) * 0.25), 1.0).astype(int)  # number of leap years from 1900
     # optional nudge by 8.64x10-7 sec to get even outputs
     # day of year plus fractional portion of a day
@@ -144,13 +224,6 @@ def invjday(jd):
     leapyrs[day1_idx] = np.floor_divide((year[day1_idx] - 1901) * 0.25, 1.0).astype(int)
     days[day1_idx] = temp[day1_idx] - ((year[day1_idx] - 1900) * 365.0 + leapyrs[day1_idx])
     # find remaing data
-    jd_size = len(jd)
-    mon = np.empty(jd_size)
-    day = np.empty(jd_size)
-    hr = np.empty(jd_size)
-    minute = np.empty(jd_size)
-    sec = np.empty(jd_size)
-    for i in range(jd_size):
-        mon[i], day[i], hr[i], minute[i], sec[i] = days2mdhms(year[i], days[i])
+    mon, day, hr, minute, sec = days2mdhms(year, days)
     sec = sec - 0.00000086400
     return year, mon, day, hr, minute, sec
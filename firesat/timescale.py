@@ -0,0 +1,159 @@
+# Conversions between the UTC, TAI, TT, TDB and UT1 time scales
+
+import os
+import functools
+import numpy as np
+from firesat.timefn import JulianDate, julian_date, jd_split, jd_join, days_since
+from firesat.constants import DAY_S, DEG2RAD, tau
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+TT_MINUS_TAI = 32.184  # [s]
+SCALES = ("utc", "tai", "tt", "tdb", "ut1")
+
+
+@functools.lru_cache(maxsize=None)
+def leap_second_table():
+    """Load the bundled leap second table once
+
+    Output:
+        jd_utc : float (m), julian dates (UTC) when each offset takes effect
+        jd_tai : float (m), the same instants as TAI julian dates
+        dat : float (m), TAI - UTC [s]
+    """
+    yr, mo, dy, dat = np.loadtxt(
+        os.path.join(DATA_DIR, "leap_seconds.txt"), unpack=True
+    )
+    jd_utc = julian_date(yr.astype(int), mo.astype(int), dy.astype(int))
+    jd_tai = jd_utc + dat / DAY_S
+    return jd_utc, jd_tai, dat
+
+
+@functools.lru_cache(maxsize=None)
+def delta_t_table():
+    """Load the bundled Delta T table once
+
+    Output:
+        jd : float (m), julian dates (TT) of the tabulated values
+        delta_t : float (m), TT - UT1 [s]
+    """
+    yr, dt = np.loadtxt(os.path.join(DATA_DIR, "delta_t.txt"), unpack=True)
+    return julian_date(yr.astype(int)), dt
+
+
+def tai_minus_utc(jd, scale="utc"):
+    """Number of leap seconds, TAI - UTC
+
+    Args:
+        jd : float (...), julian dates
+        scale : str, time scale of jd, 'utc' or 'tai'
+    Output:
+        dat : float (...), TAI - UTC [s]. Dates before 1972 use the 1972 value.
+    """
+    jd_utc, jd_tai, dat = leap_second_table()
+    edges = jd_utc if scale == "utc" else jd_tai
+    idx = np.searchsorted(edges, jd, side="right") - 1
+    return dat[np.maximum(idx, 0)]
+
+
+def delta_t(jd):
+    """Delta T, TT - UT1, interpolated linearly between tabulated values
+
+    Args:
+        jd : float (...), julian dates (TT)
+    Output:
+        delta_t : float (...), TT - UT1 [s]. Dates outside the table take the
+            value at the nearest end.
+    """
+    jd_tab, dt_tab = delta_t_table()
+    jd = np.clip(jd, jd_tab[0], jd_tab[-1])
+    idx = np.clip(np.searchsorted(jd_tab, jd, side="right") - 1, 0, jd_tab.size - 2)
+    frac = (jd - jd_tab[idx]) / (jd_tab[idx + 1] - jd_tab[idx])
+    return dt_tab[idx] + frac * (dt_tab[idx + 1] - dt_tab[idx])
+
+
+def tdb_minus_tt(jd):
+    """Periodic difference TDB - TT [s] from the two largest terms of the
+    Fairhead and Bretagnon series, accurate to about 30 microseconds
+
+    Args:
+        jd : float (...), julian dates (TT)
+    References:
+        Kaplan, USNO Circular 179, 2005, Eq. 2.6
+    """
+    g = (357.53 + 0.9856003 * (jd - 2451545.0)) * DEG2RAD
+    return 0.001657 * np.sin(g) + 0.000014 * np.sin(2 * g)
+
+
+def convert(jd, frm, to):
+    """Convert julian dates between time scales
+
+    Args:
+        jd : float (...) or timefn.JulianDate, julian dates in scale frm
+        frm : str, one of 'utc', 'tai', 'tt', 'tdb', 'ut1'
+        to : str, one of 'utc', 'tai', 'tt', 'tdb', 'ut1'
+    Output:
+        jd : float (...) or timefn.JulianDate, julian dates in scale to. The
+            offset is added to the fraction of a two-part julian date.
+    Notes:
+        Conversions go through TT. TDB to TT and UT1 to TT evaluate their
+        offsets at the input date, which differs from the TT date by less
+        than two minutes.
+    """
+    for scale in (frm, to):
+        if scale not in SCALES:
+            raise ValueError(f"unknown time scale '{scale}', expected one of {SCALES}")
+    # the tables only need the date to within a fraction of a second
+    jd1 = np.asarray(jd_join(jd), dtype=float)
+    # offset from frm to TT in seconds
+    if frm == to:
+        dt = np.zeros_like(jd1)
+    elif frm == "utc":
+        dt = tai_minus_utc(jd1, "utc") + TT_MINUS_TAI
+    elif frm == "tai":
+        dt = TT_MINUS_TAI
+    elif frm == "tt":
+        dt = 0.0
+    elif frm == "tdb":
+        dt = -tdb_minus_tt(jd1)
+    else:
+        dt = delta_t(jd1)
+    jd_tt = jd1 + dt / DAY_S
+    # offset from TT to the output scale in seconds
+    if frm == to:
+        pass
+    elif to == "utc":
+        jd_tai = jd_tt - TT_MINUS_TAI / DAY_S
+        dt = dt - TT_MINUS_TAI - tai_minus_utc(jd_tai, "tai")
+    elif to == "tai":
+        dt = dt - TT_MINUS_TAI
+    elif to == "tdb":
+        dt = dt + tdb_minus_tt(jd_tt)
+    elif to == "ut1":
+        dt = dt - delta_t(jd_tt)
+    if isinstance(jd, JulianDate):
+        return jd_split(jd, dt / DAY_S)
+    return jd1 + dt / DAY_S
+
+
+def gmst(jd, scale="ut1"):
+    """Greenwich mean sidereal time, vectorized version of `sgp4.gstime`
+
+    Args:
+        jd : float (...) or timefn.JulianDate, julian dates
+        scale : str, time scale of jd, converted to UT1 first
+    Output:
+        theta : float (...), greenwich mean sidereal time, 0 to 2pi [rad]
+    References:
+        Vallado, 2004, 191, Eq. 3-45
+    """
+    if scale != "ut1":
+        jd = convert(jd, scale, "ut1")
+    tut1 = days_since(jd, 2451545.0) / 36525.0
+    temp = (
+        -6.2e-6 * tut1 * tut1 * tut1
+        + 0.093104 * tut1 * tut1
+        + (876600.0 * 3600 + 8640184.812866) * tut1
+        + 67310.54841
+    )  # sec
+    return (temp * DEG2RAD / 240.0) % tau
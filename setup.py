@@ -26,6 +26,7 @@ setup(
     author='Sam Friedman',
     author_email="samfriedman@tamu.edu",
     packages=find_packages(),
+    package_data={'firesat': ['data/*.txt']},
     description=description,
     python_requires='>=3',
     install_requires=[